@@ -0,0 +1,17 @@
+#ifndef INTERACTION_H
+#define INTERACTION_H
+
+/**
+ * per-graph landmark interactions out[g] = L_g^T A_g R_g (K x K, row-major) of
+ * a batch; A is given by its COO entries (rows, cols, weights) in global node
+ * ids, sorted so graph g owns entries edge_offsets[g]:edge_offsets[g + 1], and
+ * L, R are (num_nodes, K) row-major, everything float32.
+ * Graphs are split across num_threads threads (<= 0: one per core).
+ */
+void batched_interaction(const int num_graphs, const long long* node_offsets,
+                         const long long* edge_offsets, const long long* rows,
+                         const long long* cols, const float* weights,
+                         const float* left, const float* right, const int K,
+                         float* out, int num_threads);
+
+#endif
@@ -13,11 +13,14 @@ import math
 
 from predict import MLPClassifier, MLPRegression
 from sklearn import metrics
-from util import cmd_args, load_data
-from sklearn.cluster import KMeans
+from util import cmd_args, load_data, FeatureCache
 from graphVec import graphVec
 from Clustering import Clustering
 from pytorch_util import weights_init, gnn_spmm
+from operators import OperatorCache
+from center_init import init_centers
+from soft_assign import top_assignment, ScheduledAssignment
+from interaction import block_diag, batched_interaction, landmark_histogram
 class SLIM(nn.Module):
     def __init__(self, output_dim, num_node_feats, num_edge_feats, latent_dim=[32, 32, 32, 1], k=30, conv1d_channels=[16, 32], conv1d_kws=[0, 5], conv1d_activation='ReLU'):
 
@@ -79,6 +82,8 @@ class Classifier(nn.Module):
                                  with_dropout=cmd_args.dropout)
         if regression:
             self.mlp = MLPRegression(input_size=out_dim, hidden_size=cmd_args.hidden, with_dropout=cmd_args.dropout)
+        self.feature_cache = FeatureCache(self.PrepareFeatureLabel)
+        self.operator_cache = OperatorCache(cmd_args.adj_norm or 'raw', device=cmd_args.device)
 
     def PrepareFeatureLabel(self, batch_graph):
         if self.regression:
@@ -108,7 +113,7 @@ class Classifier(nn.Module):
             labels[i] = batch_graph[i].label
             n_nodes += batch_graph[i].num_nodes
             if node_tag_flag == True:
-                concat_tag += batch_graph[i].node_tags
+                concat_tag.append(np.asarray(batch_graph[i].node_tags, dtype=np.int64))
             if node_feat_flag == True:
                 tmp = torch.from_numpy(batch_graph[i].node_features).type('torch.FloatTensor')
                 concat_feat.append(tmp)
@@ -118,7 +123,7 @@ class Classifier(nn.Module):
                     concat_edge_feat.append(tmp)
 
         if node_tag_flag == True:
-            concat_tag = torch.LongTensor(concat_tag).view(-1, 1)
+            concat_tag = torch.from_numpy(np.concatenate(concat_tag)).view(-1, 1)
             node_tag = torch.zeros(n_nodes, cmd_args.feat_dim)
             node_tag.scatter_(1, concat_tag, 1)
 
@@ -150,47 +155,30 @@ class Classifier(nn.Module):
 
     def forward(self, selected_idx, batch_graph, batch_graph_sub, adj_one, node_feat_all, q, u, g_list_test, pos,
                 codestrain,z):
-        import pickle
-        if len(batch_graph) == 170:
-            file = open('adj_train3021.pkl', 'rb')
-            if pos < 170:
-                batch_graph = batch_graph
-            else:
-                batch_graph = g_list_test
-        else:
-            file = open('adj_test350.pkl', 'rb')
-            batch_graph = batch_graph
-        feature_label = self.PrepareFeatureLabel(batch_graph)
-        if len(feature_label) == 2:
-            node_feat, labels = feature_label
-        elif len(feature_label) == 3:
-            node_feat, edge_feat, labels = feature_label
-        count = 0
-        graph_sizesall = [batch_graph[i].num_nodes for i in range(len(batch_graph))]
-        for i in range(int(selected_idx[0])):
-            count = graph_sizesall[i] + count
-        adj = pickle.load(file)
-        adj = torch.from_numpy(adj).type(torch.FloatTensor)
-        count1 = graph_sizesall[int(selected_idx[0])] + count
-        adjsub = adj[count:count1, count:count1]
-        q_sub = q[count:count1, :]
-        q_sub_bin = torch.sum(q_sub, 0)
-        bin = np.zeros((graph_sizesall[int(selected_idx[0])], num_centers))
-        bin11 = q_sub_bin
+        if self.training and pos >= len(batch_graph):
+            batch_graph = g_list_test
+        # features and labels of the whole list are built once and cached
+        feature_label = self.feature_cache(batch_graph)
+        labels = feature_label[-1]
+        # node rows of the selected graphs (slices of the graph bank) and their offsets within the batch
+        rows, batch_offsets = adj_one.batch_rows(selected_idx)
+        q_sub = q[torch.from_numpy(rows)]
+        if cmd_args.assign_topm:
+            # keep each node's top-m centers, the kernel then scatters O(m^2) per edge
+            q_sub = top_assignment(q_sub, cmd_args.assign_topm)
+        q_sub = q_sub.to(cmd_args.device)
+        # [B, K] cluster histograms of the batch
+        bin11 = landmark_histogram(q_sub, batch_offsets)
+        bin = torch.zeros(len(rows), num_centers, device=cmd_args.device)
 
         ##Get new features between clusters with waw/ppt(p==bin)
-        kz = adjsub
-        qk = torch.mm(q_sub.t(), kz)
-        qkq = torch.mm(qk, q_sub)
+        # block-diagonal adjacency of the batch, built once per graph and kept sparse
+        kz = block_diag([self.operator_cache(adj_one, int(i))[0] for i in selected_idx])
+        # [B, K, K] interactions of every graph
+        qkq, = batched_interaction(kz, q_sub, batch_offsets)
         labels = labels[selected_idx]
         q_sub = q_sub
-        bin = torch.from_numpy(bin).type(torch.FloatTensor)
-        bin = bin.cuda()
-        graph_sizesall = [batch_graph[i].num_nodes for i in range(len(batch_graph))]
-        count = 0
-        for i in range(int(selected_idx[0])):
-            count = graph_sizesall[i] + count
-        node_feat_all = node_feat_all[count:graph_sizesall[int(selected_idx[0])] + count, :]
+        node_feat_all = node_feat_all[rows, :]
         node_feat_all = torch.from_numpy(node_feat_all).type(torch.FloatTensor)
 
         return self.mlp( batch_graph_sub,node_feat_all, bin, qkq, q_sub, bin11,labels)
@@ -231,9 +219,8 @@ def trainloop_dataset(node_feat_Vec,epoch, Dict, Uw, adj_one, g_list, adj_one_te
 
     n_samples = 0
 
-    t = Classifier()
-    feature_label = t.PrepareFeatureLabel(g_list)
-    feature_label_test = t.PrepareFeatureLabel(g_list_test)
+    feature_label = classifier.feature_cache(g_list)
+    feature_label_test = classifier.feature_cache(g_list_test)
     if len(feature_label) == 2:
         node_feat, labels = feature_label
     elif len(feature_label) == 3:
@@ -249,11 +236,12 @@ def trainloop_dataset(node_feat_Vec,epoch, Dict, Uw, adj_one, g_list, adj_one_te
 
     z = node_feat
     if epoch == 0:
-        kmeans = KMeans(n_clusters=num_centers, n_init=20)
-        kmeans.fit_predict(node_feat2)
-        Uw.data = torch.from_numpy(kmeans.cluster_centers_).type(torch.FloatTensor)
-    kl_loss, q = Clustering(z, Uw,Dict)
-    loss1 = kl_loss
+        centers = init_centers(node_feat2, num_centers, method=cmd_args.center_init, cache_dir=cmd_args.center_cache or None,
+                               seed=cmd_args.seed, n_init=20, coreset_size=cmd_args.coreset_size)
+        Uw.data = torch.from_numpy(centers).type(torch.FloatTensor)
+    # q[rows] is assigned batch by batch, the target distribution refreshed every -target_interval batches
+    q = ScheduledAssignment(torch.from_numpy(z), Uw, interval=cmd_args.target_interval, alpha=1,
+                            chunk=cmd_args.cluster_chunk)
     '''
         Each batchgraph is entered into the classifier
      A total of 344 graph structures, of which 310 is the number of trains
@@ -272,13 +260,15 @@ def trainloop_dataset(node_feat_Vec,epoch, Dict, Uw, adj_one, g_list, adj_one_te
                                            g_list_test, pos, codestrain,z)
             all_scores.append(logits[:, 1].cpu().detach())  # for binary classification
 
-        loss1 = loss1.cuda()
+        # KL divergence on the nodes of this batch only
+        loss1 = q.kl_loss().to(cmd_args.device)
         ##klloss and classification loss
         loss = 0.1*loss1 + loss
         if optimizer is not None:
             optimizer.zero_grad()
-            loss.backward(retain_graph=True)
+            loss.backward()
             optimizer.step()
+            q.step()
         loss = loss.data.cpu().detach().numpy()
         if classifier.regression:
             pbar.set_description('MSE_loss: %0.5f MAE_loss: %0.5f' % (loss, mae))
@@ -312,8 +302,7 @@ def testloop_dataset(node_feat_Vec_test,Dict, Uw, test_idxes, adj_one, g_list, a
     n_samples = 0
     ''' test code
        '''
-    t = Classifier()
-    feature_label = t.PrepareFeatureLabel(g_list)
+    feature_label = classifier.feature_cache(g_list)
     if len(feature_label) == 2:
         node_feat, labels = feature_label
     elif len(feature_label) == 3:
@@ -369,6 +358,8 @@ if __name__ == '__main__':
     random.seed(cmd_args.seed)
     np.random.seed(cmd_args.seed)
     torch.manual_seed(cmd_args.seed)
+    if cmd_args.num_threads > 0:
+        torch.set_num_threads(cmd_args.num_threads)
     train_graphs, test_graphs, adj_one, adj_one_test, test_idxes_real = load_data()
     print('# train: %d, # test: %d' % (len(train_graphs), len(test_graphs)))
 
@@ -383,9 +374,10 @@ if __name__ == '__main__':
         classifier = classifier.cuda()
     num_centers = 100
 
-    Dict = nn.Parameter(torch.zeros(size=(14,14)))
+    feat_width = 2 * (cmd_args.feat_dim + cmd_args.attr_dim)
+    Dict = nn.Parameter(torch.zeros(size=(feat_width,feat_width)))
     torch.nn.init.eye_(Dict.data)
-    Uw = nn.Parameter(torch.zeros(size=(num_centers, 14)))
+    Uw = nn.Parameter(torch.zeros(size=(num_centers, feat_width)))
     nn.init.xavier_uniform_(Uw.data, gain=1.414)
     optimizer = optim.Adagrad([
         {'params':Dict, 'lr': 0.001},
@@ -427,8 +419,10 @@ if __name__ == '__main__':
 
         classifier.eval()
 
-        test_loss = testloop_dataset(node_feat_Vec_test,Dict, Uw, test_idxes_real, adj_one_test, test_graphs, adj_one, train_graphs,
-                                     classifier, test_idxes, )
+        # evaluation only: no autograd graph, which also lets batched_interaction use libgnn's kernel
+        with torch.no_grad():
+            test_loss = testloop_dataset(node_feat_Vec_test,Dict, Uw, test_idxes_real, adj_one_test, test_graphs, adj_one, train_graphs,
+                                         classifier, test_idxes, )
         if not cmd_args.printAUC:
             test_loss[2] = 0.0
         print('\033[95maverage test of epoch %d: loss %.5f acc %.5f auc %.5f\033[0m' % (
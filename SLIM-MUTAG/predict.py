@@ -14,7 +14,7 @@ from tqdm import tqdm
 import pdb
 
 sys.path.append('%s/lib' % os.path.dirname(os.path.realpath(__file__)))
-from pytorch_util import weights_init
+from pytorch_util import weights_init, FoldedLinear
 
 class MLPRegression(nn.Module):
     def __init__(self, input_size, hidden_size, with_dropout=False):
@@ -43,63 +43,66 @@ class MLPRegression(nn.Module):
         else:
             return pred
 
+# Layers of MLPClassifier's forward path as (attribute, in_features, out_features);
+# only these are built. The experimental layers the head used to allocate next
+# to them (h2_weights_qkq1 alone was 10000 x 5000) never took part in forward.
+HEAD_LAYERS = (
+    ('h2_weights_qkq1_100_10', 100, 10),
+    ('h2_weights_qkq1_1000_500', 1000, 500),
+    ('h2_weights_qkq1_500_200', 500, 200),
+    ('h2_weights_qkq1_200_100', 200, 100),
+    ('h2_weights_qkq1_100_50', 100, 50),
+    ('h2_weights_qkq1_50_2', 50, 2),
+)
+
+# activation-free chains of HEAD_LAYERS, folded into one affine map in eval mode
+# the first layer acts on every row of the (K, K) qkq
+QKQ_CHAIN = ('h2_weights_qkq1_100_10', 'h2_weights_qkq1_1000_500', 'h2_weights_qkq1_500_200',
+             'h2_weights_qkq1_200_100', 'h2_weights_qkq1_100_50', 'h2_weights_qkq1_50_2')
+
 class MLPClassifier(nn.Module):
     def __init__(self, input_size, hidden_size, num_class, with_dropout=False):
         super(MLPClassifier, self).__init__()
 
-        self.h1_weights = nn.Linear(input_size, hidden_size)
-        self.h1_weightsqkq = nn.Linear(input_size, hidden_size)
-        self.h1_weightsPU = nn.Linear(input_size, hidden_size)
-        self.h2_weights = nn.Linear(hidden_size, num_class)
-        self.h2_weights_bin = nn.Linear(7, 2)
-        self.h2_weights_bin1 = nn.Linear(100, 50)
-        self.h2_weights_bin12 = nn.Linear(50, 10)
-        self.h2_weights_bin13 = nn.Linear(10, 2)
-
-        self.h2_weights_qkq1_1000_100 = nn.Linear(1000, 100)
-        self.h2_weights_qkq1_100_10 = nn.Linear(100, 10)
-        ###########100x10##############
-        self.h2_weights_qkq1_100_10 = nn.Linear(100, 10)
-        self.h2_weights_qkq1_1000_500 = nn.Linear(1000, 500)
-        self.h2_weights_qkq1_500_200 = nn.Linear(500, 200)
-        self.h2_weights_qkq1_700_500=nn.Linear(700, 500)
-        self.h2_weights_qkq1_200_100 = nn.Linear(200, 100)
-        self.h2_weights_qkq1_100_50 = nn.Linear(100, 50)
-        self.h2_weights_qkq1_50_2 = nn.Linear(50, 2)
-        self.h2_weights_qkq1_100_100= nn.Linear(100, 100)
-        ###########10000##############
-        self.h2_weights_qkq1 = nn.Linear(10000,5000)
-        self.h2_weights_qkq2 = nn.Linear(5000, 1000)
-        self.h2_weights_qkq3 = nn.Linear(1000, 500)
-        self.h2_weights_qkq4 = nn.Linear(500, 10)
-        self.h2_weights_qkq5 = nn.Linear(10, 2)
-        self.h2_weights_bin = nn.Linear(10, 2)
+        for name, n_in, n_out in HEAD_LAYERS:
+            setattr(self, name, nn.Linear(n_in, n_out))
+        self.qkq_folded = FoldedLinear([getattr(self, name) for name in QKQ_CHAIN], rowwise=True)
         self.with_dropout = with_dropout
-
         weights_init(self)
 
+    def train(self, mode=True):
+        # the optimizer changes the parameters in train mode, so fold them again
+        # on the first eval forward after every switch (eval() lands here too)
+        self.qkq_folded.invalidate()
+        return super(MLPClassifier, self).train(mode)
+
     def forward(self,batch_graph_sub, node_feat_x, bin,qkq,q_sub,bin1 ,y=None, ):
 
-        bin1 = bin1.tolist()
-        bin1=[bin1]
-        bin1=np.array(bin1)
-        bin1=torch.from_numpy(bin1).type(torch.FloatTensor)
-        bin1=bin1.cuda()
+        # inputs follow the head's parameters, so -mode cpu never touches CUDA
+        device = self.h2_weights_qkq1_100_10.weight.device
+        # the histograms enter the head as constants, no gradient flows back through them
+        bin1 = torch.as_tensor(bin1, dtype=torch.float32, device=device).detach()
         bin2=bin1
 
-        qkq=qkq.cuda()
+        qkq=qkq.to(device)
 
         ##############################################  w'Aw/ppT    ###############
 
-        ppt = torch.mm(bin2.t(), bin2)
-        qkq = torch.div(qkq, ppt)
-        qkq = self.h2_weights_qkq1_100_10(qkq)
-        qkq = qkq.reshape(1, 1000)
-        qkq = self.h2_weights_qkq1_1000_500(qkq)
-        qkq = self.h2_weights_qkq1_500_200(qkq)
-        qkq = self.h2_weights_qkq1_200_100(qkq)
-        qkq = self.h2_weights_qkq1_100_50(qkq)
-        qkq = self.h2_weights_qkq1_50_2(qkq)
+        # per-graph outer products of the [B, K] histograms
+        ppt = torch.bmm(bin2.unsqueeze(2), bin2.unsqueeze(1))
+        # centers dropped by -assign_topm have empty histogram bins, and then qkq is 0 too
+        qkq = torch.div(qkq, ppt.masked_fill(ppt == 0, 1))
+        if self.training:
+            qkq = self.h2_weights_qkq1_100_10(qkq)
+            qkq = qkq.reshape(qkq.shape[0], 1000)
+            qkq = self.h2_weights_qkq1_1000_500(qkq)
+            qkq = self.h2_weights_qkq1_500_200(qkq)
+            qkq = self.h2_weights_qkq1_200_100(qkq)
+            qkq = self.h2_weights_qkq1_100_50(qkq)
+            qkq = self.h2_weights_qkq1_50_2(qkq)
+        else:
+            # one GEMM on the flattened qkq instead of the six layers
+            qkq = self.qkq_folded(qkq.reshape(qkq.shape[0], -1))
 
 
 
@@ -3,14 +3,22 @@ import numpy as np
 import random
 from tqdm import tqdm
 import os
+import sys
+import json
+import shutil
+import hashlib
 #import cPickle as cp
 #import _pickle as cp  # python3 compatability
 import networkx as nx
 import pdb
 import argparse
 
+sys.path.append('%s/lib' % os.path.dirname(os.path.realpath(__file__)))
+from graph_bank import GraphBank
+
 cmd_opt = argparse.ArgumentParser(description='Argparser for graph_classification')
 cmd_opt.add_argument('-mode', default='cpu', help='cpu/gpu')
+cmd_opt.add_argument('-num_threads', type=int, default=0, help='intra-op CPU threads of torch (0: torch default)')
 cmd_opt.add_argument('-gm', default='SLIM', help='gnn model to use')
 cmd_opt.add_argument('-data', default=None, help='data folder name')
 cmd_opt.add_argument('-batch_size', type=int, default=50, help='minibatch size')
@@ -31,13 +39,30 @@ cmd_opt.add_argument('-learning_rate', type=float, default=0.0001, help='init le
 cmd_opt.add_argument('-dropout', type=bool, default=False, help='whether add dropout after dense layer')
 cmd_opt.add_argument('-printAUC', type=bool, default=False, help='whether to print AUC (for binary classification only)')
 cmd_opt.add_argument('-extract_features', type=bool, default=False, help='whether to extract final graph features')
+cmd_opt.add_argument('-data_cache', type=int, default=1, help='keep a binary cache of the parsed dataset under data/ (1/0)')
+cmd_opt.add_argument('-cluster_chunk', type=int, default=4096, help='nodes per chunk of the soft cluster assignment (0: all at once)')
+cmd_opt.add_argument('-target_interval', type=int, default=0, help='training batches between refreshes of the DEC target distribution (0: once per epoch)')
+cmd_opt.add_argument('-assign_topm', type=int, default=0, help='keep only the top-m cluster assignments of each node in Classifier.forward (0: dense)')
+cmd_opt.add_argument('-center_init', type=str, default='kmeans', help='cluster center initialization kmeans/coreset/minibatch')
+cmd_opt.add_argument('-center_cache', type=str, default='center_cache', help='directory caching initial cluster centers (empty: no cache)')
+cmd_opt.add_argument('-coreset_size', type=int, default=10000, help='rows of the coreset clustered by -center_init coreset')
+cmd_opt.add_argument('-adj_norm', type=str, default=None, help='adjacency normalization sym/rw/raw used in Classifier.forward (default: the dataset\'s own)')
+cmd_opt.add_argument('-cv_workers', type=int, default=0, help='folds cross_validate.py trains at once (0: one per fold up to the core count)')
+cmd_opt.add_argument('-cv_logs', type=str, default='cv_logs', help='directory of the per-fold logs of cross_validate.py')
+cmd_opt.add_argument('-cv_results', type=str, default='cv_results.json', help='aggregated results record written by cross_validate.py')
 
 cmd_args, _ = cmd_opt.parse_known_args()
+# device the model, its inputs and the cluster assignments live on
+cmd_args.device = 'cuda' if cmd_args.mode == 'gpu' else 'cpu'
 
 cmd_args.latent_dim = [int(x) for x in cmd_args.latent_dim.split('-')]
 if len(cmd_args.latent_dim) == 1:
     cmd_args.latent_dim = cmd_args.latent_dim[0]
 
+CACHE_VERSION = 2
+# file in the cache directory naming the directory of the current version
+CACHE_POINTER = 'current'
+
 class GNNGraph(object):
     def __init__(self, g, label, node_tags=None, node_features=None):
         '''
@@ -78,15 +103,64 @@ class GNNGraph(object):
                 self.edge_features.append(edge_features[edge])  # add reversed edges
             self.edge_features = np.concatenate(self.edge_features, 0)
 
+    @classmethod
+    def from_arrays(cls, label, node_tags, node_features, degs, edge_pairs):
+        '''
+            rebuild a graph from the binary dataset cache without going through networkx;
+            node_tags, degs and edge_pairs (the flattened int32 array GNNGraph would
+            have built) may be read-only views of the cache arrays
+        '''
+        graph = cls.__new__(cls)
+        graph.num_nodes = len(node_tags)
+        graph.node_tags = node_tags
+        graph.label = label
+        graph.node_features = node_features
+        graph.degs = degs
+        graph.num_edges = len(edge_pairs) // 2
+        graph.edge_pairs = edge_pairs if graph.num_edges > 0 else np.array([])
+        graph.edge_features = None
+        return graph
 
-def load_data():
-    print('SLIM >>>')
-    print('loading data')
+
+class FeatureCache(object):
+    '''
+        keeps the output of prepare (e.g. Classifier.PrepareFeatureLabel) for whole
+        graph lists, so the one-hot/attribute matrix and label vector of a dataset
+        are built once instead of on every training step
+
+        prepare: callable mapping a list of GNNGraph to (node_feat, [edge_feat,] labels)
+    '''
+    def __init__(self, prepare):
+        self.prepare = prepare
+        self._entries = {}
+
+    def __call__(self, graph_list):
+        '''
+            returns feature_label of graph_list; entries are keyed by the list object
+            and rebuilt if its length changes
+        '''
+        entry = self._entries.get(id(graph_list))
+        if entry is None or entry[0] is not graph_list or entry[1] != len(graph_list):
+            # the list itself is kept so its id cannot be reused by another list
+            entry = (graph_list, len(graph_list), self.prepare(graph_list))
+            self._entries[id(graph_list)] = entry
+        return entry[2]
+
+
+def _file_sha1(path):
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+
+def _parse_data(path):
     g_list = []
     label_dict = {}
     feat_dict = {}
 
-    with open('data/%s/%s.txt' % (cmd_args.data, cmd_args.data), 'r') as f:
+    with open(path, 'r') as f:
         n_g = int(f.readline().strip())
         adj_one=[]
         adj_node_all=[]
@@ -133,10 +207,8 @@ def load_data():
 
             if node_features != []:
                 node_features = np.stack(node_features)
-                node_feature_flag = True
             else:
                 node_features = None
-                node_feature_flag = False
 
 
             assert len(g) == n
@@ -145,14 +217,161 @@ def load_data():
 
     for g in g_list:
         g.label = label_dict[g.label]
+    return g_list, GraphBank.from_lists(adj_node_all), label_dict, feat_dict
+
+
+def _write_cache(cache_dir, path, g_list, bank, label_dict, feat_dict):
+    '''
+        dump the parsed dataset as flat .npy arrays (node offsets, CSR adjacency,
+        node tags, labels, nx edge pairs and degrees) plus a small meta.json
+    '''
+    with_attr = [g.node_features is not None for g in g_list]
+    if any(with_attr) and not all(with_attr):
+        print('node attributes on only some graphs, not caching %s' % path)
+        return
+    arrays = {}
+    arrays['node_offsets'] = np.cumsum([0] + [g.num_nodes for g in g_list]).astype(np.int64)
+    arrays['edge_offsets'] = np.cumsum([0] + [g.num_edges for g in g_list]).astype(np.int64)
+    arrays['labels'] = np.array([g.label for g in g_list], dtype=np.int64)
+    arrays['node_tags'] = np.array([t for g in g_list for t in g.node_tags], dtype=np.int32)
+    arrays['degs'] = np.array([d for g in g_list for d in g.degs], dtype=np.int32)
+    edge_pairs = [g.edge_pairs for g in g_list if g.num_edges > 0]
+    arrays['edge_pairs'] = np.concatenate(edge_pairs).astype(np.int32) if edge_pairs else np.zeros(0, dtype=np.int32)
+    arrays['adj_indptr'] = bank.indptr
+    arrays['adj_indices'] = bank.local_indices().astype(np.int32)
+    if all(with_attr):
+        arrays['node_features'] = np.concatenate([g.node_features for g in g_list], 0)
+
+    st = os.stat(path)
+    meta = {'version': CACHE_VERSION,
+            'source': {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'sha1': _file_sha1(path)},
+            'num_graphs': len(g_list),
+            'label_dict': sorted(label_dict.items()),
+            'feat_dict': sorted(feat_dict.items()),
+            'arrays': sorted(arrays)}
+
+    # every version of the cache gets its own directory, built next to it and renamed;
+    # readers find it through the pointer file, which is swapped atomically, so a
+    # concurrent fold sees either the old or the new cache but never a missing one
+    version = '%s.v%d' % (meta['source']['sha1'], CACHE_VERSION)
+    version_dir = os.path.join(cache_dir, version)
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir, exist_ok=True)
+    if not os.path.isdir(version_dir):
+        tmp_dir = '%s.tmp%d' % (version_dir, os.getpid())
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        for name, arr in arrays.items():
+            np.save(os.path.join(tmp_dir, name + '.npy'), arr)
+        with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+        try:
+            os.rename(tmp_dir, version_dir)
+        except OSError:
+            # another process finished the same cache first
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    pointer = os.path.join(cache_dir, CACHE_POINTER)
+    tmp = '%s.tmp%d' % (pointer, os.getpid())
+    with open(tmp, 'w') as f:
+        f.write(version)
+    os.replace(tmp, pointer)
+    # drop older versions (and the pre-pointer layout); processes still mapping
+    # their files keep the pages until they exit
+    for name in os.listdir(cache_dir):
+        if name in (version, CACHE_POINTER) or '.tmp' in name:
+            continue
+        stale = os.path.join(cache_dir, name)
+        if os.path.isdir(stale):
+            shutil.rmtree(stale, ignore_errors=True)
+        else:
+            os.remove(stale)
+
+
+def _read_cache(cache_dir, path):
+    pointer = os.path.join(cache_dir, CACHE_POINTER)
+    if not os.path.exists(pointer):
+        return None
+    with open(pointer, 'r') as f:
+        version_dir = os.path.join(cache_dir, f.read().strip())
+    meta_path = os.path.join(version_dir, 'meta.json')
+    try:
+        with open(meta_path, 'r') as f:
+            meta = json.load(f)
+    except (IOError, OSError):
+        # replaced by a newer version since the pointer was read
+        return None
+    if meta.get('version') != CACHE_VERSION:
+        return None
+    source = meta['source']
+    st = os.stat(path)
+    if st.st_size != source['size']:
+        return None
+    if st.st_mtime_ns != source['mtime_ns']:
+        # touched (e.g. re-extracted) but maybe unchanged: fall back to the content hash
+        if _file_sha1(path) != source['sha1']:
+            return None
+        source['mtime_ns'] = st.st_mtime_ns
+        tmp = '%s.tmp%d' % (meta_path, os.getpid())
+        try:
+            with open(tmp, 'w') as f:
+                json.dump(meta, f)
+            os.replace(tmp, meta_path)
+        except OSError:
+            pass
+
+    arrays = {}
+    try:
+        for name in meta['arrays']:
+            # plain ndarray views of the read-only maps: nothing is copied here, every
+            # graph below only slices them and pages are read on first touch
+            arrays[name] = np.asarray(np.load(os.path.join(version_dir, name + '.npy'), mmap_mode='r'))
+    except (IOError, OSError):
+        return None
+    node_offsets = arrays['node_offsets']
+    edge_offsets = arrays['edge_offsets']
+    labels = arrays['labels']
+    node_tags = arrays['node_tags']
+    degs = arrays['degs']
+    edge_pairs = arrays['edge_pairs']
+    node_features = arrays.get('node_features')
+
+    g_list = []
+    for i in range(meta['num_graphs']):
+        n0, n1 = int(node_offsets[i]), int(node_offsets[i + 1])
+        e0, e1 = int(edge_offsets[i]), int(edge_offsets[i + 1])
+        attr = node_features[n0:n1] if node_features is not None else None
+        g_list.append(GNNGraph.from_arrays(int(labels[i]), node_tags[n0:n1], attr, degs[n0:n1],
+                                           edge_pairs[2 * e0:2 * e1]))
+    label_dict = dict((k, v) for k, v in meta['label_dict'])
+    feat_dict = dict((k, v) for k, v in meta['feat_dict'])
+    bank = GraphBank.from_local(arrays['adj_indptr'], arrays['adj_indices'], arrays['node_offsets'])
+    return g_list, bank, label_dict, feat_dict
+
+
+def load_data():
+    print('SLIM >>>')
+    print('loading data')
+    path = 'data/%s/%s.txt' % (cmd_args.data, cmd_args.data)
+    cache_dir = 'data/%s/%s.cache' % (cmd_args.data, cmd_args.data)
+    loaded = _read_cache(cache_dir, path) if cmd_args.data_cache else None
+    if loaded is None:
+        loaded = _parse_data(path)
+        if cmd_args.data_cache:
+            _write_cache(cache_dir, path, *loaded)
+    else:
+        print('using cached dataset %s' % cache_dir)
+    g_list, bank, label_dict, feat_dict = loaded
+    n_g = len(g_list)
+
     cmd_args.num_class = len(label_dict)
     cmd_args.feat_dim = len(feat_dict) # maximum node label (tag)
     cmd_args.edge_feat_dim = 0
-    if node_feature_flag == True:
-        cmd_args.attr_dim = node_features.shape[1] # dim of node features (attributes)
+    if g_list[-1].node_features is not None:
+        cmd_args.attr_dim = g_list[-1].node_features.shape[1] # dim of node features (attributes)
     else:
         cmd_args.attr_dim = 0
 
+
     print('# classes: %d' % cmd_args.num_class)
     print('# maximum node tag: %d' % cmd_args.feat_dim)
 
@@ -162,19 +381,10 @@ def load_data():
         train_idxes = np.loadtxt('data/%s/10fold_idx/train_idx-%d.txt' % (cmd_args.data, cmd_args.fold), dtype=np.int32).tolist()
         test_idxes = np.loadtxt('data/%s/10fold_idx/test_idx-%d.txt' % (cmd_args.data, cmd_args.fold), dtype=np.int32).tolist()
 
-        adj_one_one=[]
-        adj_one_one_test = []
-        for i in range(len(train_idxes)):
-            adj_one_one.append(adj_node_all[train_idxes[i]])
-        for i in range(len(test_idxes)):
-
-            adj_one_one_test.append(adj_node_all[test_idxes[i]])
-
-
-        return [g_list[i] for i in train_idxes], [g_list[i] for i in test_idxes],adj_one_one,adj_one_one_test,test_idxes
+        return [g_list[i] for i in train_idxes], [g_list[i] for i in test_idxes], bank.subset(train_idxes), bank.subset(test_idxes), test_idxes
     else:
 
-        return g_list[: n_g - cmd_args.test_number], g_list[n_g - cmd_args.test_number :],adj_node_all
+        return g_list[: n_g - cmd_args.test_number], g_list[n_g - cmd_args.test_number :],bank
 
 
 
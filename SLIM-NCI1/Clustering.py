@@ -6,13 +6,15 @@
 # @File : Clustering.py
 # @Software: PyCharm
 
+import os
+import sys
 import torch
 import torch.nn.functional as F
 
+from util import cmd_args
+sys.path.append('%s/lib' % os.path.dirname(os.path.realpath(__file__)))
+from soft_assign import soft_assignment, target_distribution, kl_divergence
 
-def target_distribution(q):
-    weight = q ** 2 / q.sum(0)
-    return (weight.t() / weight.sum(1)).t()
 
 def Clustering(z, Uw, Dict):
         # print("Uw", Uw.shape)
@@ -22,10 +24,7 @@ def Clustering(z, Uw, Dict):
         # Uw_mean = torch.mean(Uw)
         # z_mean = torch.mean(z)
         # z = (Uw_mean / z_mean) * z
-        q = 1.0 / (1.0 + torch.sum(
-            torch.pow(z.unsqueeze(1) - Uw, 2), 2))
-        q = q.pow((1 + 1.0) / 2.0)
-        q = (q.t() / torch.sum(q, 1)).t()
+        q = soft_assignment(z, Uw, chunk=cmd_args.cluster_chunk)
         """
          2.target distribution
        """
@@ -34,5 +33,5 @@ def Clustering(z, Uw, Dict):
         """
        3.Kullback-Leibler (KL) divergence 
           """
-        kl_loss = F.kl_div(q.log(), p)
+        kl_loss = kl_divergence(q, p)
         return kl_loss, q
\ No newline at end of file
@@ -0,0 +1,86 @@
+import json
+import multiprocessing as mp
+import os
+import runpy
+import sys
+import time
+
+import numpy as np
+
+# native thread pools that would otherwise each start one thread per core
+THREAD_ENV = ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS')
+
+
+def _init_worker(threads):
+    # set before the fold imports torch/numpy's BLAS for the first time
+    for name in THREAD_ENV:
+        os.environ[name] = str(threads)
+
+
+def _run_fold(job):
+    '''
+        trains one fold by running the training script as __main__ in this
+        (fresh) worker and returns the last epoch's test metrics
+    '''
+    script, argv, fold, threads, log_dir = job
+    argv = [arg.replace('{fold}', str(fold)) for arg in argv]
+    sys.argv = [script] + argv + ['-fold', str(fold), '-num_threads', str(threads)]
+    sys.path.insert(0, os.path.dirname(os.path.abspath(script)))
+    start = time.time()
+    with open(os.path.join(log_dir, 'fold%d.log' % fold), 'w') as log:
+        sys.stdout = sys.stderr = log
+        try:
+            scope = runpy.run_path(script, run_name='__main__')
+        finally:
+            sys.stdout, sys.stderr = sys.__stdout__, sys.__stderr__
+    loss, acc, auc = [float(x) for x in scope['test_loss']]
+    return {'fold': fold, 'loss': loss, 'acc': acc, 'auc': auc, 'seconds': time.time() - start}
+
+
+def cross_validate(script, argv, folds=range(1, 11), workers=0, log_dir='cv_logs'):
+    '''
+        trains the folds of script (main.py) concurrently and returns a single
+        record of the per-fold test metrics and their mean and std accuracy
+
+        argv: command line of script without -fold; '{fold}' in an argument is
+              replaced by the fold number
+        workers: concurrent folds, 0 for one per fold up to the number of cores;
+                 the cores are split evenly and every fold capped to its share
+                 of torch and BLAS threads
+        log_dir: each fold's output goes to log_dir/fold<k>.log
+
+        This only parallelizes the fold runs: every fold runs script in a fresh
+        spawned process, so its module-level state (cmd_args, caches) never leaks
+        into the next fold, but each one also imports torch and libgnn and does
+        its own preprocessing. What is deduplicated is what already sits in an
+        on-disk cache built once before calling this: the parsed dataset, which
+        the folds memory-map (load_data()), and the LA store, whose rows every
+        fold gathers by graph hash (precompute_LA.py).
+    '''
+    folds = list(folds)
+    cores = mp.cpu_count()
+    workers = min(workers or cores, len(folds))
+    threads = max(1, cores // workers)
+    if not os.path.isdir(log_dir):
+        os.makedirs(log_dir)
+    jobs = [(script, list(argv), fold, threads, log_dir) for fold in folds]
+
+    start = time.time()
+    ctx = mp.get_context('spawn')
+    pool = ctx.Pool(workers, initializer=_init_worker, initargs=(threads,), maxtasksperchild=1)
+    try:
+        results = pool.map(_run_fold, jobs, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+    acc = np.array([r['acc'] for r in results])
+    return {'script': script, 'argv': list(argv), 'workers': workers, 'threads_per_worker': threads,
+            'folds': results, 'acc_mean': float(acc.mean()), 'acc_std': float(acc.std()),
+            'seconds': time.time() - start}
+
+
+def write_record(record, path):
+    tmp = '%s.tmp%d' % (path, os.getpid())
+    with open(tmp, 'w') as f:
+        json.dump(record, f, indent=2)
+    os.replace(tmp, path)
@@ -18,6 +18,45 @@ extern "C" int PrepareSparseMatrices(void *_batch_graph,
                                      void **list_of_idxes,
                                      void **list_of_vals);
 
+extern "C" int PrepareSparseMatricesThreaded(const int num_graphs,
+                                             const int *num_nodes,
+                                             const int *num_edges,
+                                             void **list_of_edge_pairs,
+                                             void **list_of_idxes,
+                                             void **list_of_vals,
+                                             int num_threads);
+
+extern "C" int PrepareSparseMatricesCSR(const int num_graphs,
+                                        const int *num_nodes,
+                                        const int *num_edges,
+                                        void **list_of_edge_pairs,
+                                        void **list_of_crows,
+                                        void **list_of_cols,
+                                        void **list_of_vals,
+                                        int num_threads);
+
+extern "C" int WalkSums(const int num_graphs,
+                        const long long *node_offsets,
+                        const long long *indptr,
+                        const long long *indices,
+                        const double *feat,
+                        const int dim,
+                        const int max_order,
+                        double *out,
+                        int num_threads);
+
+extern "C" int BatchedInteraction(const int num_graphs,
+                                  const long long *node_offsets,
+                                  const long long *edge_offsets,
+                                  const long long *rows,
+                                  const long long *cols,
+                                  const float *weights,
+                                  const float *left,
+                                  const float *right,
+                                  const int K,
+                                  float *out,
+                                  int num_threads);
+
 extern "C" int NumEdgePairs(void *_graph);
 
 #endif
@@ -0,0 +1,145 @@
+import hashlib
+import multiprocessing
+import os
+import numpy as np
+
+from khop import bank_walk_sums
+from la_store import layout_digest
+
+
+def graph_hash(graph, csr, feat_dim):
+    '''
+        sha1 of everything the LA rows of one graph depend on: its neighbour lists
+        (GraphBank.graph_csr), node tags and node attributes (and the one-hot
+        width feat_dim)
+    '''
+    indptr, indices = csr
+    h = hashlib.sha1()
+    h.update(np.array([feat_dim, len(indptr) - 1], dtype=np.int64).tobytes())
+    h.update(np.diff(indptr).astype(np.int64).tobytes())
+    h.update(indices.astype(np.int64).tobytes())
+    h.update(np.asarray(graph.node_tags, dtype=np.int64).tobytes())
+    if graph.node_features is not None:
+        h.update(np.ascontiguousarray(graph.node_features, dtype=np.float64).tobytes())
+    return h.hexdigest()
+
+
+def graph_layout(graphs, bank, feat_dim):
+    '''
+        (hashes, num_nodes) of graphs in their node order, the layout LAStore
+        records with every order and checks load() against
+    '''
+    hashes = [graph_hash(g, bank.graph_csr(i), feat_dim) for i, g in enumerate(graphs)]
+    return hashes, np.diff(bank.node_offsets).tolist()
+
+
+def node_inputs(graph, feat_dim):
+    '''
+        the node features main.py feeds to the LA aggregation: one-hot node tags,
+        followed by the node attributes if the dataset has them
+    '''
+    x = np.zeros((graph.num_nodes, feat_dim))
+    x[np.arange(graph.num_nodes), graph.node_tags] = 1
+    if graph.node_features is not None:
+        x = np.concatenate((x, graph.node_features), axis=1)
+    return x
+
+
+def _walk_shard(task):
+    '''
+        pool worker: [A^k X for k in orders] over the graphs of one shard
+    '''
+    if task is None:
+        return None
+    bank, node_feat, orders = task
+    # one thread per worker process, the pool already spreads shards over the cores
+    walks = bank_walk_sums(bank, node_feat, max(orders), num_threads=1)
+    return [walks[k - 1] for k in orders]
+
+
+def precompute(store, graphs, bank, feat_dim, orders, workers=0, chunk_nodes=50000):
+    '''
+        writes the order-th LA features A^k X of every graph to store, rows in the
+        order of graphs with their graph hashes, by which LAStore.load gathers them
+        into any other fold's order; bank is the GraphBank of graphs
+
+        Graphs are cut into shards of about chunk_nodes nodes that a pool of
+        workers processes while the results are streamed into the store, so
+        only a few shards are ever held in memory. An order whose rows already
+        cover every graph hash, in any graph order, is left as it is: one store
+        serves all folds of a dataset. Otherwise the order is rewritten in the
+        order of graphs, copying the rows of graphs it already holds instead of
+        recomputing them.
+    '''
+    orders = sorted(set(orders))
+    assert orders[0] >= 1, 'LA orders start at 1'
+    hashes, num_nodes = graph_layout(graphs, bank, feat_dim)
+    digest = layout_digest(hashes)
+    dim = node_inputs(graphs[0], feat_dim).shape[1]
+
+    old_rows = {}
+    for k in orders:
+        entry = store.manifest['orders'].get(str(k))
+        if entry is not None and entry['shape'][1] == dim:
+            if entry.get('layout') == digest:
+                continue
+            rows = store.graph_rows(k)
+            # another fold's order holding every graph: LAStore.load gathers the rows
+            if rows and all(h in rows for h in hashes):
+                continue
+            old_rows[k] = rows
+        else:
+            old_rows[k] = {}
+    if not old_rows:
+        print('LA orders %s in %s are up to date' % (orders, store.root))
+        return
+    todo = sorted(old_rows)
+    old = dict((k, store.load(k)) for k in todo if old_rows[k])
+    reuse = [all(h in old_rows[k] for k in todo) for h in hashes]
+    print('LA orders %s: recomputing %d of %d graphs' % (todo, reuse.count(False), len(graphs)))
+
+    shards = []
+    start = 0
+    while start < len(graphs):
+        stop, size = start, 0
+        while stop < len(graphs) and (size == 0 or size + num_nodes[stop] <= chunk_nodes):
+            size += num_nodes[stop]
+            stop += 1
+        shards.append((start, stop))
+        start = stop
+
+    def tasks():
+        for start, stop in shards:
+            fresh = [i for i in range(start, stop) if not reuse[i]]
+            if not fresh:
+                yield None
+                continue
+            node_feat = np.concatenate([node_inputs(graphs[i], feat_dim) for i in fresh], axis=0)
+            yield bank.subset(fresh), node_feat, todo
+
+    out = dict((k, store.create(k, (sum(num_nodes), dim))) for k in todo)
+    workers = workers or os.cpu_count()
+    pool = multiprocessing.Pool(workers) if workers > 1 else None
+    try:
+        results = pool.imap(_walk_shard, tasks()) if pool is not None else map(_walk_shard, tasks())
+        row = 0
+        for (start, stop), walks in zip(shards, results):
+            fresh_row = 0
+            for i in range(start, stop):
+                n = num_nodes[i]
+                for o, k in enumerate(todo):
+                    if reuse[i]:
+                        src = old_rows[k][hashes[i]]
+                        out[k][row:row + n] = old[k][src:src + n]
+                    else:
+                        out[k][row:row + n] = walks[o][fresh_row:fresh_row + n]
+                if not reuse[i]:
+                    fresh_row += n
+                row += n
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    for k in todo:
+        store.commit(k, out.pop(k), source='precompute', layout=(hashes, num_nodes))
+    print('LA orders %s written to %s' % (todo, store.root))
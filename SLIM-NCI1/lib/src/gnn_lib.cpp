@@ -2,6 +2,8 @@
 #include "config.h"
 #include "msg_pass.h"
 #include "graph_struct.h"
+#include "khop.h"
+#include "interaction.h"
 #include <random>
 #include <algorithm>
 #include <cstdlib>
@@ -101,3 +103,80 @@ int PrepareSparseMatrices(void *_batch_graph,
     return 0;
 }
 
+
+int PrepareSparseMatricesThreaded(const int num_graphs,
+                                  const int *num_nodes,
+                                  const int *num_edges,
+                                  void **list_of_edge_pairs,
+                                  void **list_of_idxes,
+                                  void **list_of_vals,
+                                  int num_threads)
+{
+    // COO: the row indices of matrix k, then its column indices
+    long long *rows[3], *cols[3];
+    long long total_nodes = 0, total_edges = 0;
+    for (int i = 0; i < num_graphs; ++i)
+    {
+        total_nodes += num_nodes[i];
+        total_edges += 2 * (long long)num_edges[i];
+    }
+    for (int k = 0; k < 3; ++k)
+    {
+        rows[k] = static_cast<long long *>(list_of_idxes[k]);
+        cols[k] = rows[k] + (k < 2 ? total_edges : total_nodes);
+    }
+    batch_construct(num_graphs, num_nodes, num_edges, list_of_edge_pairs,
+                    rows, cols, NULL,
+                    reinterpret_cast<Dtype **>(list_of_vals),
+                    num_threads);
+    return 0;
+}
+
+int PrepareSparseMatricesCSR(const int num_graphs,
+                             const int *num_nodes,
+                             const int *num_edges,
+                             void **list_of_edge_pairs,
+                             void **list_of_crows,
+                             void **list_of_cols,
+                             void **list_of_vals,
+                             int num_threads)
+{
+    batch_construct(num_graphs, num_nodes, num_edges, list_of_edge_pairs,
+                    NULL,
+                    reinterpret_cast<long long **>(list_of_cols),
+                    reinterpret_cast<long long **>(list_of_crows),
+                    reinterpret_cast<Dtype **>(list_of_vals),
+                    num_threads);
+    return 0;
+}
+
+int WalkSums(const int num_graphs,
+             const long long *node_offsets,
+             const long long *indptr,
+             const long long *indices,
+             const double *feat,
+             const int dim,
+             const int max_order,
+             double *out,
+             int num_threads)
+{
+    walk_sums(num_graphs, node_offsets, indptr, indices, feat, dim, max_order, out, num_threads);
+    return 0;
+}
+
+int BatchedInteraction(const int num_graphs,
+                       const long long *node_offsets,
+                       const long long *edge_offsets,
+                       const long long *rows,
+                       const long long *cols,
+                       const float *weights,
+                       const float *left,
+                       const float *right,
+                       const int K,
+                       float *out,
+                       int num_threads)
+{
+    batched_interaction(num_graphs, node_offsets, edge_offsets, rows, cols, weights,
+                        left, right, K, out, num_threads);
+    return 0;
+}
@@ -22,11 +22,17 @@ import math
 import pdb
 from predict import MLPClassifier, MLPRegression
 from sklearn import metrics
-from util import cmd_args, load_data
+from util import cmd_args, load_data, FeatureCache
 from graphVec import graphVec
 from Clustering import Clustering
 from pytorch_util import weights_init, gnn_spmm
-from sklearn.cluster import KMeans
+from la_store import LAStore
+from la_precompute import graph_layout
+from graph_bank import GraphBank
+from operators import OperatorCache
+from center_init import init_centers
+from soft_assign import top_assignment, ScheduledAssignment
+from interaction import block_diag, batched_interaction, landmark_histogram
 
 class SLIM(nn.Module):
     def __init__(self, output_dim, num_node_feats, num_edge_feats, latent_dim=[32, 32, 32, 1], k=30, conv1d_channels=[16, 32], conv1d_kws=[0, 5], conv1d_activation='ReLU'):
@@ -94,6 +100,8 @@ class Classifier(nn.Module):
                                  with_dropout=cmd_args.dropout)
         if regression:
             self.mlp = MLPRegression(input_size=out_dim, hidden_size=cmd_args.hidden, with_dropout=cmd_args.dropout)
+        self.feature_cache = FeatureCache(self.PrepareFeatureLabel)
+        self.operator_cache = OperatorCache(cmd_args.adj_norm or 'raw', device=cmd_args.device)
 
     def PrepareFeatureLabel(self, batch_graph):
         if self.regression:
@@ -124,7 +132,7 @@ class Classifier(nn.Module):
             labels[i] = batch_graph[i].label
             n_nodes += batch_graph[i].num_nodes
             if node_tag_flag == True:
-                concat_tag += batch_graph[i].node_tags
+                concat_tag.append(np.asarray(batch_graph[i].node_tags, dtype=np.int64))
             if node_feat_flag == True:
                 tmp = torch.from_numpy(batch_graph[i].node_features).type('torch.FloatTensor')
                 concat_feat.append(tmp)
@@ -134,7 +142,7 @@ class Classifier(nn.Module):
                     concat_edge_feat.append(tmp)
 
         if node_tag_flag == True:
-            concat_tag = torch.LongTensor(concat_tag).view(-1, 1)
+            concat_tag = torch.from_numpy(np.concatenate(concat_tag)).view(-1, 1)
             node_tag = torch.zeros(n_nodes, cmd_args.feat_dim)
             node_tag.scatter_(1, concat_tag, 1)
 
@@ -167,72 +175,32 @@ class Classifier(nn.Module):
 
     def forward(self,selected_idx, batch_graph,batch_graph_sub,adj_one,node_feat_all,q,u,bin1,g_list_test,pos,codestrain):
 
-        if len(batch_graph)==3699:
-
-           if pos < 3699:
-               batch_graph = batch_graph
-           else:
-               batch_graph = g_list_test
-        else:
-
-            batch_graph = batch_graph
-        feature_label = self.PrepareFeatureLabel(batch_graph)
-        feature_label_sub = self.PrepareFeatureLabel(batch_graph_sub)
-        labels_sub=0
-        if len(feature_label) == 2:
-            node_feat, labels = feature_label
-            edge_feat = None
-        elif len(feature_label) == 3:
-            node_feat, edge_feat, labels = feature_label
-        if len(feature_label_sub) == 2:
-                node_feat, labels1 = feature_label_sub
-                edge_feat = None
-        elif len(feature_label_sub) == 3:
-                node_feat, edge_feat, labels1 = feature_label_sub
-
-        count = 0
-        graph_sizesall = [batch_graph[i].num_nodes for i in range(len(batch_graph))]
-        for i in range(int(selected_idx[0])):
-            count = graph_sizesall[i] + count
-
-
-        count1=graph_sizesall[int(selected_idx[0])] + count
-
-        deltacount=count1-count
-        adjsub = np.zeros([deltacount, deltacount])
-
-        for ii in range(deltacount):
-            for jj in range(len(adj_one[int(selected_idx[0])][ii])):
-                adjsub[ii][adj_one[int(selected_idx[0])][ii][jj]] = 1
-
-        q_sub=q[count:count1,:]
-        q_sub_bin=np.sum(q_sub,0)
-        codes = np.argmax(q_sub, 1)
-        codes.tolist()
-        bin=np.zeros((graph_sizesall[int(selected_idx[0])],num_centers))
-        bin11=q_sub_bin
-        qsum=q_sub.sum(axis=0)
-        P=np.zeros([num_centers,num_centers])
-        for i in range(num_centers):
-            P[i][i]=qsum[i]
-
-        kz = adjsub
-        qk = np.dot(q_sub.transpose(), kz)
-        qkq = np.dot(qk, q_sub)
+        if pos >= len(batch_graph):
+            batch_graph = g_list_test
+        # features and labels of the whole list are built once and cached
+        feature_label = self.feature_cache(batch_graph)
+        labels = feature_label[-1]
+        # node rows of the selected graphs (slices of the graph bank) and their offsets within the batch
+        rows, batch_offsets = adj_one.batch_rows(selected_idx)
+
+        q_sub=q[torch.from_numpy(rows)]
+        if cmd_args.assign_topm:
+            # keep each node's top-m centers, the kernel then scatters O(m^2) per edge
+            q_sub = top_assignment(q_sub, cmd_args.assign_topm)
+        q_sub = q_sub.to(cmd_args.device)
+        # [B, K] cluster histograms of the batch
+        bin11=landmark_histogram(q_sub, batch_offsets)
+        bin = torch.zeros(len(rows), num_centers, device=cmd_args.device)
+
+        # block-diagonal adjacency of the batch, built once per graph and kept sparse
+        kz = block_diag([self.operator_cache(adj_one, int(i))[0] for i in selected_idx])
+        # [B, K, K] interactions of every graph
+        qkq, = batched_interaction(kz, q_sub, batch_offsets)
         labels=labels[selected_idx]
         q_sub=q_sub
-        bin = torch.from_numpy(bin).type(torch.FloatTensor)
-        bin= bin.cuda()
 
-        count = 0
-        for i in range(int(selected_idx[0])):
-            count = graph_sizesall[i] + count
-
-        node_feat_all = node_feat_all[count:graph_sizesall[int(selected_idx[0])] + count, :]
+        node_feat_all = node_feat_all[rows, :]
         node_feat_all = torch.from_numpy(node_feat_all).type(torch.FloatTensor)
-        qkq = qkq.tolist()
-        qkq = [qkq]
-        qkq = np.array(qkq)
 
         return self.mlp(node_feat_all,bin,qkq,q_sub,bin11,labels)
 
@@ -279,33 +247,30 @@ def trainloop_dataset(node_feat_new6,Dict,epoch,W,Uw,adj_one,g_list,adj_one_test
 
     node_feat = torch.relu(node_feat_new6)
 
-    z = node_feat[0:122747]
-
-    kmeans = KMeans(n_clusters=num_centers, n_init=20)
+    z = node_feat
 
     if epoch==0:
        print("Clustering...")
        z31 = node_feat.detach().numpy()
-       kmeans.fit_predict(z31)
-       Uw = torch.from_numpy(kmeans.cluster_centers_).type(torch.FloatTensor)
+       centers = init_centers(z31, num_centers, method=cmd_args.center_init, cache_dir=cmd_args.center_cache or None,
+                              seed=cmd_args.seed, n_init=20, coreset_size=cmd_args.coreset_size)
+       Uw = torch.from_numpy(centers).type(torch.FloatTensor)
 
-    kl_loss, q = Clustering(z, Uw,Dict)
-
-
-    q=q.detach().numpy()
-    loss1 =  kl_loss
+    # q[rows] is assigned batch by batch, the target distribution refreshed every -target_interval batches
+    q = ScheduledAssignment(z, Uw, interval=cmd_args.target_interval, chunk=cmd_args.cluster_chunk)
 
     codestrain = []
     for pos in pbar:
 
-        if pos < 3699:
+        if pos * bsize < len(sample_idxes):
            selected_idx = sample_idxes[pos * bsize: (pos + 1) * bsize]
            batch_graph = [g_list[idx] for idx in selected_idx]
            targets = [g_list[idx].label for idx in selected_idx]
 
         else:
 
-           pos1=pos-3699
+           # batches past the training graphs walk the test graphs, the last training batch may be partial
+           pos1=pos-(len(sample_idxes) + bsize - 1) // bsize
            selected_idx = sample_test_idxes[pos1 * bsize: (pos1 + 1) * bsize]
            batch_graph = [g_list_test[idx] for idx in selected_idx]
            targets = [g_list_test[idx].label for idx in selected_idx]
@@ -319,14 +284,16 @@ def trainloop_dataset(node_feat_new6,Dict,epoch,W,Uw,adj_one,g_list,adj_one_test
 
             logits, loss, acc = classifier(selected_idx,g_list,batch_graph,adj_one,node_feat1,q,Uw,bin,g_list_test,pos,codestrain)
             all_scores.append(logits[:, 1].cpu().detach())  # for binary classification
-        loss1 = loss1.cuda()
+        # KL divergence on the nodes of this batch only
+        loss1 = q.kl_loss().to(cmd_args.device)
 
         loss=0.1*loss1+loss
 
         if optimizer is not None:
             optimizer.zero_grad()
-            loss.backward(retain_graph=True)
+            loss.backward()
             optimizer.step()
+            q.step()
 
         loss = loss.data.cpu().detach().numpy()
 
@@ -368,7 +335,7 @@ def testloop_dataset(node_feat_new6,Dict,W,Uw,test_idxes,adj_one,g_list, adj_one
     kl_loss, q = Clustering(node_feat, Uw,Dict)
     codes = np.argmax(q.detach().numpy(), 1)
     bin = np.bincount(codes)
-    q = q.detach().numpy()
+    q = q.detach()
 
     codestrain=[]
     for pos in pbar:
@@ -419,6 +386,8 @@ if __name__ == '__main__':
     random.seed(cmd_args.seed)
     np.random.seed(cmd_args.seed)
     torch.manual_seed(cmd_args.seed)
+    if cmd_args.num_threads > 0:
+        torch.set_num_threads(cmd_args.num_threads)
 
     train_graphs, test_graphs ,adj_one,adj_one_test,test_idxes_real= load_data()
     print('# train: %d, # test: %d' % (len(train_graphs), len(test_graphs)))
@@ -437,7 +406,7 @@ if __name__ == '__main__':
     nn.init.xavier_uniform_(W.data, gain=1.414)
     Uw = nn.Parameter(torch.zeros(size=(num_centers,17)))
     nn.init.xavier_uniform_(Uw.data, gain=1.414)
-    Dict = nn.Parameter(torch.zeros(size=(74, 17)))
+    Dict = nn.Parameter(torch.zeros(size=(2 * (cmd_args.feat_dim + cmd_args.attr_dim), 17)))
     torch.nn.init.eye_(Dict.data)
     optimizer = optim.Adagrad([
         {'params': Dict, 'lr': 0.001},
@@ -448,6 +417,8 @@ if __name__ == '__main__':
     print("classifier.parameters()",classifier.parameters())
 
     train_idxes = list(range(len(train_graphs)))
+    num_train_nodes = adj_one.num_nodes
+    num_test_nodes = adj_one_test.num_nodes
     test_idxes = list(range(len(test_graphs)))
 
     best_loss = None
@@ -470,18 +441,14 @@ if __name__ == '__main__':
     node_feat1 = node_feat
     node_feat1 = np.array(node_feat1)
     node_feat = np.array(node_feat)
-    import pickle
-
-    file = open('1order_LA_NCI1.pkl', 'rb')
-    LA1 = pickle.load(file)
-    file = open('2order_LA_NCI1.pkl', 'rb')
-    LA2 = pickle.load(file)
-    file = open('3order_LA_NCI1.pkl', 'rb')
-    LA3 = pickle.load(file)
+    la_store = LAStore(cmd_args.la_dir, legacy='%dorder_LA_NCI1')
+    # rows of this fold's graphs, in its train-then-test order
+    la_layout = graph_layout(train_graphs + test_graphs, GraphBank.concat([adj_one, adj_one_test]), cmd_args.feat_dim)
+    LA2 = la_store.load(2, layout=la_layout)
+    LA3 = la_store.load(3, layout=la_layout)
     node_feat = torch.from_numpy(node_feat).type('torch.FloatTensor')
-    LA1 = torch.from_numpy(LA1).type('torch.FloatTensor')
-    LA2 = torch.from_numpy(LA2).type('torch.FloatTensor')
-    LA3 = torch.from_numpy(LA3).type('torch.FloatTensor')
+    LA2 = torch.from_numpy(np.asarray(LA2, dtype=np.float32))
+    LA3 = torch.from_numpy(np.asarray(LA3, dtype=np.float32))
     LAALL = LA2 + LA3
     node_feat_new1 = torch.cat((node_feat, LAALL), 1)
 
@@ -495,7 +462,9 @@ if __name__ == '__main__':
 
         classifier.eval()
 
-        test_loss = testloop_dataset(node_feat_new1[110232:122747],Dict,W,Uw,test_idxes_real,adj_one_test,test_graphs,adj_one,train_graphs, classifier, test_idxes,)
+        # evaluation only: no autograd graph, which also lets batched_interaction use libgnn's kernel
+        with torch.no_grad():
+            test_loss = testloop_dataset(node_feat_new1[num_train_nodes:num_train_nodes + num_test_nodes],Dict,W,Uw,test_idxes_real,adj_one_test,test_graphs,adj_one,train_graphs, classifier, test_idxes,)
         if not cmd_args.printAUC:
             test_loss[2] = 0.0
         print('\033[95maverage test of epoch %d: loss %.5f acc %.5f auc %.5f\033[0m' % (epoch, test_loss[0], test_loss[1], test_loss[2]))
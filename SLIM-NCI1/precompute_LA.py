@@ -0,0 +1,30 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @File : precompute_LA.py
+
+# Builds the nth-order LA features read by main.py into the LA store, e.g.
+#     python precompute_LA.py -data NCI1 -fold 1
+# Rows follow the train-then-test node order of the chosen fold and are keyed by
+# graph hash, so the store serves every fold; running it for another fold is a
+# no-op. Re-running after graphs were added or edited only recomputes those.
+import os
+import sys
+
+from util import cmd_args, load_data
+
+sys.path.append('%s/lib' % os.path.dirname(os.path.realpath(__file__)))
+from la_store import LAStore
+from la_precompute import precompute
+from graph_bank import GraphBank
+
+# hop orders main.py loads from the store
+LA_ORDERS = (2, 3)
+
+if __name__ == '__main__':
+    train_graphs, test_graphs, adj_one, adj_one_test, _ = load_data()
+    if cmd_args.la_orders:
+        orders = [int(x) for x in cmd_args.la_orders.split('-')]
+    else:
+        orders = LA_ORDERS
+    precompute(LAStore(cmd_args.la_dir), train_graphs + test_graphs, GraphBank.concat([adj_one, adj_one_test]),
+               cmd_args.feat_dim, orders, workers=cmd_args.la_workers, chunk_nodes=cmd_args.la_chunk)
@@ -0,0 +1,29 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @File : cross_validate.py
+
+# 10-fold cross-validation of main.py with the folds trained concurrently, e.g.
+#     python cross_validate.py -data PROTEINS -num_epochs 200 -cv_workers 5
+# takes the same arguments as main.py (but -fold). Per-fold output is written
+# to -cv_logs, the aggregated accuracy to -cv_results. Build the LA store once
+# with precompute_LA.py for any fold: the folds look its rows up by graph hash.
+import os
+import sys
+
+sys.path.append('%s/lib' % os.path.dirname(os.path.realpath(__file__)))
+from cv_runner import cross_validate, write_record
+
+if __name__ == '__main__':
+    # imported here: the spawned workers re-import this module, and util must
+    # parse the fold's own arguments there
+    from util import cmd_args, load_data
+
+    if cmd_args.data_cache:
+        # parse the dataset once, the folds then map the binary cache
+        load_data()
+    record = cross_validate('main.py', sys.argv[1:], workers=cmd_args.cv_workers, log_dir=cmd_args.cv_logs)
+    write_record(record, cmd_args.cv_results)
+    for r in record['folds']:
+        print('fold %d: acc %.5f auc %.5f (%.0fs)' % (r['fold'], r['acc'], r['auc'], r['seconds']))
+    print('accuracy %.5f +- %.5f over %d folds, %.0fs in total' % (
+        record['acc_mean'], record['acc_std'], len(record['folds']), record['seconds']))
@@ -15,6 +15,8 @@ class _gnn_lib(object):
         self.lib.PrepareBatchGraph.restype = ctypes.c_int
         self.lib.PrepareSparseMatrices.restype = ctypes.c_int
         self.lib.NumEdgePairs.restype = ctypes.c_int
+        # the threaded/CSR entry points return c_int too, ctypes' default; they are not
+        # looked up here so a libgnn.so built before them still loads
 
         if sys.version_info[0] > 2:
             args = [arg.encode() for arg in args]  # str -> bytes for each element in args
@@ -25,19 +27,9 @@ class _gnn_lib(object):
         self.batch_graph_handle = ctypes.c_void_p(self.lib.GetGraphStruct())
 
     def _prepare_graph(self, graph_list, is_directed=0):    
-        edgepair_list = (ctypes.c_void_p * len(graph_list))()
-        list_num_nodes = np.zeros((len(graph_list), ), dtype=np.int32)
-        list_num_edges = np.zeros((len(graph_list), ), dtype=np.int32)        
-        for i in range(len(graph_list)):
-            if type(graph_list[i].edge_pairs) is ctypes.c_void_p:
-                edgepair_list[i] = graph_list[i].edge_pairs
-            elif type(graph_list[i].edge_pairs) is np.ndarray:
-                edgepair_list[i] = ctypes.c_void_p(graph_list[i].edge_pairs.ctypes.data)
-            else:
-                raise NotImplementedError
-
-            list_num_nodes[i] = graph_list[i].num_nodes
-            list_num_edges[i] = graph_list[i].num_edges
+        edgepair_list = self._edge_pair_list(graph_list)
+        list_num_nodes = np.array([g.num_nodes for g in graph_list], dtype=np.int32)
+        list_num_edges = np.array([g.num_edges for g in graph_list], dtype=np.int32)
         total_num_nodes = np.sum(list_num_nodes)
         total_num_edges = np.sum(list_num_edges)
 
@@ -50,38 +42,146 @@ class _gnn_lib(object):
 
         return total_num_nodes, total_num_edges
 
-    def PrepareSparseMatrices(self, graph_list, is_directed=0):
+    def _edge_pair_list(self, graph_list):
+        edgepair_list = (ctypes.c_void_p * len(graph_list))()
+        for i in range(len(graph_list)):
+            if type(graph_list[i].edge_pairs) is ctypes.c_void_p:
+                edgepair_list[i] = graph_list[i].edge_pairs
+            elif type(graph_list[i].edge_pairs) is np.ndarray:
+                edgepair_list[i] = ctypes.c_void_p(graph_list[i].edge_pairs.ctypes.data)
+            else:
+                raise NotImplementedError
+        return edgepair_list
+
+    def PrepareSparseMatrices(self, graph_list, is_directed=0, num_threads=1, layout='coo'):
+        '''
+            n2n, e2n and subg of graph_list as torch sparse tensors
+
+            Library API: the SLIM scripts do not call it, Classifier.forward takes
+            its normalized adjacencies from operators.OperatorCache instead.
+
+            num_threads: 1 builds the batch graph and the matrices serially; any other
+                         value fills them straight from the edge pairs with graphs
+                         split across that many threads (0: one per core), giving
+                         the same matrices
+            layout: 'coo' for COO tensors, 'csr' for torch.sparse_csr
+                    tensors written directly by libgnn, without the 2 x nnz index
+                    arrays; the entries are the same, CSR is always built by the
+                    threaded path
+        '''
         assert not is_directed
-        total_num_nodes, total_num_edges = self._prepare_graph(graph_list, is_directed)
-        
-        n2n_idxes = torch.LongTensor(2, total_num_edges * 2)
-        n2n_vals = torch.FloatTensor(total_num_edges * 2)
-
-        e2n_idxes = torch.LongTensor(2, total_num_edges * 2)
-        e2n_vals = torch.FloatTensor(total_num_edges * 2)
-
-        subg_idxes = torch.LongTensor(2, total_num_nodes)
-        subg_vals = torch.FloatTensor(total_num_nodes)
-
-        idx_list = (ctypes.c_void_p * 3)()
-        idx_list[0] = n2n_idxes.numpy().ctypes.data
-        idx_list[1] = e2n_idxes.numpy().ctypes.data
-        idx_list[2] = subg_idxes.numpy().ctypes.data
-
+        assert layout in ('coo', 'csr'), 'unknown sparse layout %s' % layout
+        if num_threads == 1 and layout == 'coo':
+            total_num_nodes, total_num_edges = self._prepare_graph(graph_list, is_directed)
+        else:
+            list_num_nodes = np.array([g.num_nodes for g in graph_list], dtype=np.int32)
+            list_num_edges = np.array([g.num_edges for g in graph_list], dtype=np.int32)
+            total_num_nodes = int(list_num_nodes.sum())
+            total_num_edges = int(list_num_edges.sum())
+        shapes = [(total_num_nodes, total_num_nodes), (total_num_nodes, total_num_edges * 2),
+                  (len(graph_list), total_num_nodes)]
+        nnz = [total_num_edges * 2, total_num_edges * 2, total_num_nodes]
+
+        vals = [torch.FloatTensor(n) for n in nnz]
         val_list = (ctypes.c_void_p * 3)()
-        val_list[0] = n2n_vals.numpy().ctypes.data
-        val_list[1] = e2n_vals.numpy().ctypes.data
-        val_list[2] = subg_vals.numpy().ctypes.data
-
-        self.lib.PrepareSparseMatrices(self.batch_graph_handle,
-                                ctypes.cast(idx_list, ctypes.c_void_p),
-                                ctypes.cast(val_list, ctypes.c_void_p))
-
-        n2n_sp = torch.sparse.FloatTensor(n2n_idxes, n2n_vals, torch.Size([total_num_nodes, total_num_nodes]))
-        e2n_sp = torch.sparse.FloatTensor(e2n_idxes, e2n_vals, torch.Size([total_num_nodes, total_num_edges * 2]))
-        subg_sp = torch.sparse.FloatTensor(subg_idxes, subg_vals, torch.Size([len(graph_list), total_num_nodes]))
+        val_list[:] = [v.numpy().ctypes.data for v in vals]
+
+        if layout == 'csr':
+            crows = [torch.LongTensor(shape[0] + 1) for shape in shapes]
+            cols = [torch.LongTensor(n) for n in nnz]
+            crow_list = (ctypes.c_void_p * 3)()
+            crow_list[:] = [c.numpy().ctypes.data for c in crows]
+            col_list = (ctypes.c_void_p * 3)()
+            col_list[:] = [c.numpy().ctypes.data for c in cols]
+            self.lib.PrepareSparseMatricesCSR(len(graph_list),
+                                    ctypes.c_void_p(list_num_nodes.ctypes.data),
+                                    ctypes.c_void_p(list_num_edges.ctypes.data),
+                                    ctypes.cast(self._edge_pair_list(graph_list), ctypes.c_void_p),
+                                    ctypes.cast(crow_list, ctypes.c_void_p),
+                                    ctypes.cast(col_list, ctypes.c_void_p),
+                                    ctypes.cast(val_list, ctypes.c_void_p),
+                                    num_threads)
+            return tuple(torch.sparse_csr_tensor(crow, col, val, size=shape)
+                         for crow, col, val, shape in zip(crows, cols, vals, shapes))
+
+        idxes = [torch.LongTensor(2, n) for n in nnz]
+        idx_list = (ctypes.c_void_p * 3)()
+        idx_list[:] = [i.numpy().ctypes.data for i in idxes]
+
+        if num_threads == 1:
+            self.lib.PrepareSparseMatrices(self.batch_graph_handle,
+                                    ctypes.cast(idx_list, ctypes.c_void_p),
+                                    ctypes.cast(val_list, ctypes.c_void_p))
+        else:
+            self.lib.PrepareSparseMatricesThreaded(len(graph_list),
+                                    ctypes.c_void_p(list_num_nodes.ctypes.data),
+                                    ctypes.c_void_p(list_num_edges.ctypes.data),
+                                    ctypes.cast(self._edge_pair_list(graph_list), ctypes.c_void_p),
+                                    ctypes.cast(idx_list, ctypes.c_void_p),
+                                    ctypes.cast(val_list, ctypes.c_void_p),
+                                    num_threads)
+
+        n2n_sp, e2n_sp, subg_sp = [torch.sparse_coo_tensor(idx, val, shape)
+                                   for idx, val, shape in zip(idxes, vals, shapes)]
         return n2n_sp, e2n_sp, subg_sp
 
+    def WalkSums(self, bank, node_feat, max_order, out=None, num_threads=0):
+        '''
+            (max_order, N, d) float64 walk sums A X, ..., A^max_order X over the N nodes
+            of a GraphBank, A[i, j] counting how often j is listed as a neighbour of
+            i (as khop.walk_sums); graphs are split across num_threads threads
+            (0: one per core)
+
+            node_feat: (N, d) features of the bank's nodes, read in place when already
+                       C-contiguous float64
+            out: C-contiguous float64 (max_order, N, d) array to write into instead
+                 of a new one
+        '''
+        node_feat = np.ascontiguousarray(node_feat, dtype=np.float64)
+        assert node_feat.ndim == 2 and node_feat.shape[0] == bank.num_nodes
+        shape = (max_order, bank.num_nodes, node_feat.shape[1])
+        if out is None:
+            out = np.empty(shape, dtype=np.float64)
+        assert out.shape == shape and out.dtype == np.float64 and out.flags['C_CONTIGUOUS']
+        arrays = [np.ascontiguousarray(a, dtype=np.int64) for a in (bank.node_offsets, bank.indptr, bank.indices)]
+        self.lib.WalkSums(len(bank),
+                          *[ctypes.c_void_p(a.ctypes.data) for a in arrays],
+                          ctypes.c_void_p(node_feat.ctypes.data),
+                          node_feat.shape[1],
+                          max_order,
+                          ctypes.c_void_p(out.ctypes.data),
+                          num_threads)
+        return out
+
+    def BatchedInteraction(self, node_offsets, edge_offsets, rows, cols, weights, left, right, out=None,
+                           num_threads=0):
+        '''
+            (B, K, K) float32 per-graph products L_g^T A_g R_g, computed by libgnn
+            without holding the GIL, so Python threads can run batches concurrently
+
+            node_offsets: B + 1 node offsets of the graphs
+            edge_offsets: B + 1 offsets of each graph's entries in rows/cols/weights
+            rows, cols, weights: COO entries of the block-diagonal A, global node ids
+            left, right: (N, K) float32 matrices L and R
+            out: C-contiguous float32 (B, K, K) array to write into instead of a new one
+            num_threads: threads the graphs are split across (0: one per core)
+        '''
+        node_offsets, edge_offsets, rows, cols = [np.ascontiguousarray(a, dtype=np.int64)
+                                                  for a in (node_offsets, edge_offsets, rows, cols)]
+        weights, left, right = [np.ascontiguousarray(a, dtype=np.float32) for a in (weights, left, right)]
+        num_graphs, k = len(node_offsets) - 1, left.shape[1]
+        assert left.shape == right.shape and left.shape[0] == node_offsets[-1]
+        if out is None:
+            out = np.empty((num_graphs, k, k), dtype=np.float32)
+        assert out.shape == (num_graphs, k, k) and out.dtype == np.float32 and out.flags['C_CONTIGUOUS']
+        self.lib.BatchedInteraction(num_graphs,
+                                    *[ctypes.c_void_p(a.ctypes.data) for a in (node_offsets, edge_offsets, rows, cols,
+                                                                              weights, left, right)],
+                                    k,
+                                    ctypes.c_void_p(out.ctypes.data),
+                                    num_threads)
+        return out
+
 dll_path = '%s/build/dll/libgnn.so' % os.path.dirname(os.path.realpath(__file__))
 if os.path.exists(dll_path):
     GNNLIB = _gnn_lib(sys.argv)
@@ -0,0 +1,132 @@
+import numpy as np
+
+
+def concat_ranges(starts, sizes):
+    '''
+        np.concatenate([np.arange(s, s + n) for s, n in zip(starts, sizes)]) without
+        the Python loop
+    '''
+    starts = np.asarray(starts, dtype=np.int64)
+    sizes = np.asarray(sizes, dtype=np.int64)
+    offsets = np.zeros(len(sizes) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(sizes)
+    return np.repeat(starts - offsets[:-1], sizes) + np.arange(offsets[-1])
+
+
+class GraphBank(object):
+    '''
+        neighbour lists of a list of graphs as one block-diagonal CSR matrix
+
+        indptr: (N + 1,) row pointers over the N nodes of all graphs
+        indices: global node id of every listed neighbour (repeats are kept)
+        node_offsets: (G + 1,) the nodes of graph i are node_offsets[i]:node_offsets[i + 1]
+        edge_offsets: (G + 1,) its entries of indices, indptr[node_offsets]
+
+        Every per-graph lookup is a slice of these arrays, and the whole bank is a
+        handful of flat arrays that pickle cheaply to worker processes.
+    '''
+    def __init__(self, indptr, indices, node_offsets):
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.node_offsets = np.asarray(node_offsets, dtype=np.int64)
+        self.edge_offsets = self.indptr[self.node_offsets]
+
+    @classmethod
+    def from_lists(cls, adj_lists):
+        '''
+            adj_lists: one entry per graph, each a list of per-node neighbour lists
+                       using graph-local node ids (the layout util._parse_data reads)
+        '''
+        node_offsets = np.zeros(len(adj_lists) + 1, dtype=np.int64)
+        node_offsets[1:] = np.cumsum([len(adj) for adj in adj_lists])
+        degrees = [len(nbrs) for adj in adj_lists for nbrs in adj]
+        indptr = np.zeros(len(degrees) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum(degrees)
+        indices = np.fromiter((v for adj in adj_lists for nbrs in adj for v in nbrs),
+                              dtype=np.int64, count=int(indptr[-1]))
+        return cls.from_local(indptr, indices, node_offsets)
+
+    @classmethod
+    def from_local(cls, indptr, indices, node_offsets):
+        '''
+            bank of a CSR whose indices are graph-local node ids
+        '''
+        indptr = np.asarray(indptr, dtype=np.int64)
+        node_offsets = np.asarray(node_offsets, dtype=np.int64)
+        node_graph = np.repeat(node_offsets[:-1], np.diff(node_offsets))
+        shift = np.repeat(node_graph, np.diff(indptr))
+        return cls(indptr, np.asarray(indices, dtype=np.int64) + shift, node_offsets)
+
+    @classmethod
+    def concat(cls, banks):
+        '''
+            the graphs of banks one after the other, e.g. train then test
+        '''
+        node_base = np.cumsum([0] + [bank.num_nodes for bank in banks])
+        edge_base = np.cumsum([0] + [bank.num_entries for bank in banks])
+        indptr = np.concatenate([bank.indptr[:-1] + edge_base[b] for b, bank in enumerate(banks)] + [edge_base[-1:]])
+        indices = np.concatenate([bank.indices + node_base[b] for b, bank in enumerate(banks)])
+        node_offsets = np.concatenate([bank.node_offsets[:-1] + node_base[b] for b, bank in enumerate(banks)] +
+                                      [node_base[-1:]])
+        return cls(indptr, indices, node_offsets)
+
+    def __len__(self):
+        return len(self.node_offsets) - 1
+
+    @property
+    def num_nodes(self):
+        return int(self.node_offsets[-1])
+
+    @property
+    def num_entries(self):
+        return int(self.indptr[-1])
+
+    def graph_size(self, i):
+        return int(self.node_offsets[i + 1] - self.node_offsets[i])
+
+    def node_slice(self, i):
+        return slice(int(self.node_offsets[i]), int(self.node_offsets[i + 1]))
+
+    def edge_slice(self, i):
+        return slice(int(self.edge_offsets[i]), int(self.edge_offsets[i + 1]))
+
+    def graph_csr(self, i):
+        '''
+            (indptr, indices) of graph i alone, in graph-local node ids
+        '''
+        nodes, edges = self.node_slice(i), self.edge_slice(i)
+        indptr = self.indptr[nodes.start:nodes.stop + 1] - edges.start
+        return indptr, self.indices[edges] - nodes.start
+
+    def local_indices(self):
+        '''
+            indices in graph-local node ids, the layout of the dataset cache
+        '''
+        return self.indices - np.repeat(np.repeat(self.node_offsets[:-1], np.diff(self.node_offsets)),
+                                        np.diff(self.indptr))
+
+    def batch_rows(self, selected_idx):
+        '''
+            node rows of the graphs selected_idx in any matrix laid out by node_offsets,
+            and the node offsets of those graphs within the rows
+        '''
+        selected_idx = np.asarray(selected_idx, dtype=np.int64)
+        starts = self.node_offsets[selected_idx]
+        sizes = self.node_offsets[selected_idx + 1] - starts
+        batch_offsets = np.zeros(len(selected_idx) + 1, dtype=np.int64)
+        batch_offsets[1:] = np.cumsum(sizes)
+        return concat_ranges(starts, sizes), batch_offsets
+
+    def subset(self, idx):
+        '''
+            bank of the graphs idx, in that order
+        '''
+        idx = np.asarray(idx, dtype=np.int64)
+        rows, node_offsets = self.batch_rows(idx)
+        degrees = self.indptr[rows + 1] - self.indptr[rows]
+        indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum(degrees)
+        entries = concat_ranges(self.indptr[rows], degrees)
+        # move every neighbour id from its old graph's node range to the new one
+        shift = np.repeat(node_offsets[:-1] - self.node_offsets[idx], np.diff(indptr[node_offsets]))
+        return GraphBank(indptr, self.indices[entries] + shift, node_offsets)
@@ -14,4 +14,16 @@ void e2e_construct(GraphStruct* graph, long long* idxes, Dtype* vals);
 
 void subg_construct(GraphStruct* graph, long long* idxes, Dtype* vals);
 
+/**
+ * n2n, e2n and subg of a batch of undirected graphs straight from their edge
+ * pairs, graphs split across num_threads threads (<= 0: one per core); entries
+ * come in the order of PrepareBatchGraph followed by the three constructs,
+ * which is row-major. Per matrix k, rows[k] and cols[k] receive the COO
+ * indices, or with rows == NULL, crows[k] the CSR row pointers (crows == NULL
+ * skips them); cols[k] and vals[k] are filled either way
+ */
+void batch_construct(const int num_graphs, const int* num_nodes, const int* num_edges,
+                     void** list_of_edge_pairs, long long** rows, long long** cols,
+                     long long** crows, Dtype** vals, int num_threads);
+
 #endif
\ No newline at end of file
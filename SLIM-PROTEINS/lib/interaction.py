@@ -0,0 +1,233 @@
+import numpy as np
+import scipy.sparse as sp
+import torch
+
+from soft_assign import TopAssignment
+
+
+def _spmm(adj, x):
+    if isinstance(adj, torch.Tensor):
+        return torch.sparse.mm(adj, x) if adj.is_sparse else torch.mm(adj, x)
+    return adj.dot(x)
+
+
+def _mm_t(q, y):
+    if isinstance(q, torch.Tensor):
+        return torch.mm(q.t(), y)
+    return q.transpose().dot(y)
+
+
+def _numpy(x):
+    return x.cpu().numpy() if isinstance(x, torch.Tensor) else x
+
+
+def _scatter_sum(flat, values, shape):
+    '''
+        dense array of the given shape with values summed at the flat (numpy) indices;
+        torch values keep their device and gradient
+    '''
+    size = int(np.prod(shape))
+    if isinstance(values, torch.Tensor):
+        flat = torch.from_numpy(np.ascontiguousarray(flat).reshape(-1)).to(values.device)
+        return values.new_zeros(size).index_add(0, flat, values.reshape(-1)).reshape(shape)
+    out = np.bincount(flat.reshape(-1), weights=values.reshape(-1), minlength=size)
+    return out.reshape(shape).astype(values.dtype)
+
+
+def _edges(adj):
+    '''
+        (rows, cols, weights) of a sparse adjacency, indices as numpy arrays
+    '''
+    if isinstance(adj, torch.Tensor):
+        adj = adj.coalesce()
+        rows, cols = _numpy(adj.indices())
+        return rows, cols, adj.values()
+    adj = adj.tocoo()
+    return adj.row, adj.col, adj.data
+
+
+def interaction(adj, q, powers=(1,)):
+    '''
+        landmark interactions q^T A^k q of one graph, one (K, K) matrix per k in powers
+
+        adj: (n, n) adjacency operator, a torch sparse/dense tensor or a scipy matrix
+        q: (n, K) soft landmark assignment of the graph's nodes, torch or numpy to match
+
+        A^k is never formed: A is applied k times to q, so the cost is
+        O(|E| K) per power plus O(n K^2) for the final product.
+    '''
+    out = []
+    cur, p = q, 0
+    for k in sorted(powers):
+        while p < k:
+            cur = _spmm(adj, cur)
+            p += 1
+        out.append(_mm_t(q, cur))
+    return [out[sorted(powers).index(k)] for k in powers]
+
+
+def block_diag(ops):
+    '''
+        block-diagonal matrix of the square sparse operators in ops, torch sparse for
+        torch operators and scipy CSR otherwise
+    '''
+    if not isinstance(ops[0], torch.Tensor):
+        return sp.block_diag(ops, format='csr')
+    if len(ops) == 1:
+        return ops[0]
+    sizes = [op.shape[0] for op in ops]
+    offsets = np.zeros(len(ops) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(sizes)
+    ops = [op.coalesce() for op in ops]
+    indices = torch.cat([op.indices() + int(offsets[i]) for i, op in enumerate(ops)], 1)
+    values = torch.cat([op.values() for op in ops])
+    n = int(offsets[-1])
+    return torch.sparse_coo_tensor(indices, values, (n, n)).coalesce()
+
+
+def landmark_histogram(q, offsets):
+    '''
+        (B, K) per-graph sums of the soft assignments q, graph b owning rows
+        offsets[b]:offsets[b + 1]
+    '''
+    offsets = np.asarray(offsets, dtype=np.int64)
+    graph_id = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+    if isinstance(q, TopAssignment):
+        # O(n m): every node only adds to its m kept centers
+        k = q.num_centers
+        flat = graph_id[:, None] * k + _numpy(q.index)
+        return _scatter_sum(flat, q.value, (len(offsets) - 1, k))
+    if isinstance(q, torch.Tensor):
+        out = q.new_zeros(len(offsets) - 1, q.shape[1])
+        return out.index_add(0, torch.from_numpy(graph_id).to(q.device), q)
+    out = np.zeros((len(offsets) - 1, q.shape[1]), dtype=q.dtype)
+    np.add.at(out, graph_id, q)
+    return out
+
+
+def batched_interaction(adj, q, offsets, powers=(1,)):
+    '''
+        interaction() for a batch of B graphs at once, one (B, K, K) array per power
+
+        adj: block-diagonal (N, N) adjacency of the batch (see block_diag)
+        q: (N, K) assignments, the nodes of graph b being rows offsets[b]:offsets[b + 1]
+        offsets: B + 1 node offsets of the batch
+
+        The sparse products run once over the whole batch; the per-graph q_b^T y_b
+        are then done by a single batched matmul over graphs zero-padded to the
+        largest one. Without autograd (evaluation under torch.no_grad) a CPU float32
+        q goes to libgnn's threaded kernel instead, see _native_batched_interaction.
+    '''
+    if isinstance(q, TopAssignment):
+        return _top_batched_interaction(adj, q, offsets, powers)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    if _use_native(adj, q):
+        return _native_batched_interaction(adj, q, offsets, powers)
+    sizes = np.diff(offsets)
+    num_graphs, n_max = len(sizes), int(sizes.max()) if len(sizes) else 0
+    graph_id = np.repeat(np.arange(num_graphs), sizes)
+    local = np.arange(offsets[-1]) - offsets[graph_id]
+    if isinstance(q, torch.Tensor):
+        index = (torch.from_numpy(graph_id).to(q.device), torch.from_numpy(local).to(q.device))
+
+        def pad(x):
+            return x.new_zeros(num_graphs, n_max, x.shape[1]).index_put(index, x)
+
+        def bmm(a, b):
+            return torch.bmm(a.transpose(1, 2), b)
+    else:
+        def pad(x):
+            out = np.zeros((num_graphs, n_max, x.shape[1]), dtype=x.dtype)
+            out[graph_id, local] = x
+            return out
+
+        def bmm(a, b):
+            return np.matmul(a.transpose(0, 2, 1), b)
+
+    q_pad = pad(q)
+    out = []
+    cur, p = q, 0
+    for k in sorted(powers):
+        while p < k:
+            cur = _spmm(adj, cur)
+            p += 1
+        out.append(bmm(q_pad, pad(cur)))
+    return [out[sorted(powers).index(k)] for k in powers]
+
+
+def _native_lib():
+    '''
+        GNNLIB if libgnn is built with BatchedInteraction, else None
+    '''
+    from gnn_lib import GNNLIB
+    if GNNLIB is not None and hasattr(GNNLIB.lib, 'BatchedInteraction'):
+        return GNNLIB
+    return None
+
+
+def _use_native(adj, q):
+    # the native kernel has no backward, so only when nothing needs a gradient
+    if not (isinstance(q, torch.Tensor) and isinstance(adj, torch.Tensor) and adj.is_sparse):
+        return False
+    if q.device.type != 'cpu' or adj.device.type != 'cpu' or q.dtype != torch.float32:
+        return False
+    if torch.is_grad_enabled() and (q.requires_grad or adj.requires_grad):
+        return False
+    return _native_lib() is not None
+
+
+def _native_batched_interaction(adj, q, offsets, powers):
+    '''
+        batched_interaction() by libgnn's BatchedInteraction, O(|E_b| K + n_b K^2) per
+        graph with no padding, graphs split across torch's intra-op threads; q^T A^k q
+        is computed as q^T A (A^(k-1) q), the A^(k-1) q of higher powers by torch
+    '''
+    lib = _native_lib()
+    adj = adj.coalesce()
+    rows, cols = adj.indices().numpy()
+    weights = adj.values().detach().numpy()
+    # coalesced entries are sorted by row, so every graph's edges are contiguous
+    edge_offsets = np.searchsorted(rows, offsets)
+    left = q.detach().contiguous()
+    out = {}
+    cur, p = left, 1
+    for power in sorted(powers):
+        while p < power:
+            cur = torch.sparse.mm(adj, cur)
+            p += 1
+        out[power] = torch.from_numpy(lib.BatchedInteraction(offsets, edge_offsets, rows, cols, weights,
+                                                             left.numpy(), cur.detach().numpy(),
+                                                             num_threads=torch.get_num_threads()))
+    return [out[power] for power in powers]
+
+
+def _top_batched_interaction(adj, q, offsets, powers):
+    '''
+        batched_interaction() for a TopAssignment q
+
+        q^T A q is scattered edge by edge, each edge (i, j) adding the m x m products
+        of the kept weights of i and j: O(|E| m^2) instead of O(|E| K + n K^2).
+        Higher powers still apply A to the dense assignment, O(|E| K) each, but the
+        final left product by q^T only costs O(n m K).
+    '''
+    offsets = np.asarray(offsets, dtype=np.int64)
+    num_graphs, k = len(offsets) - 1, q.num_centers
+    graph_id = np.repeat(np.arange(num_graphs), np.diff(offsets))
+    index = _numpy(q.index)
+    shape = (num_graphs, k, k)
+    out = {}
+    if 1 in powers:
+        rows, cols, w = _edges(adj)
+        flat = (graph_id[rows][:, None, None] * k + index[rows][:, :, None]) * k + index[cols][:, None, :]
+        prod = w[:, None, None] * q.value[rows][:, :, None] * q.value[cols][:, None, :]
+        out[1] = _scatter_sum(flat, prod, shape)
+    higher = sorted(p for p in powers if p > 1)
+    if higher:
+        flat = (graph_id[:, None, None] * k + index[:, :, None]) * k + np.arange(k)[None, None, :]
+        cur, p = q.to_dense(), 0
+        for power in higher:
+            while p < power:
+                cur = _spmm(adj, cur)
+                p += 1
+            out[power] = _scatter_sum(flat, q.value[:, :, None] * cur[:, None, :], shape)
+    return [out[power] for power in powers]
@@ -0,0 +1,88 @@
+import numpy as np
+import scipy.sparse as sp
+
+
+def block_adjacency(indptr, indices, dtype=np.float64):
+    '''
+        sparse adjacency A with A[i, j] = number of times j is listed as a neighbour of i,
+        which is exactly what the nested graphVec loops walk over
+    '''
+    num_nodes = len(indptr) - 1
+    adj = sp.csr_matrix((np.ones(len(indices), dtype=dtype), indices, indptr), shape=(num_nodes, num_nodes))
+    adj.sum_duplicates()
+    return adj
+
+
+def walk_sums(adj, node_feat, max_order):
+    '''
+        [A X, A^2 X, ..., A^max_order X]; row i of A^k X is the sum of X over every
+        k-step walk leaving i, each order reusing the previous one
+    '''
+    out = []
+    cur = np.asarray(node_feat, dtype=np.float64)
+    for _ in range(max_order):
+        cur = adj.dot(cur)
+        out.append(cur)
+    return out
+
+
+def bank_walk_sums(bank, node_feat, max_order, num_threads=1):
+    '''
+        walk_sums() over the graphs of a GraphBank, by libgnn's threaded WalkSums
+        (num_threads, 0: one per core) when the library is built and by scipy
+        otherwise; the orders are views of one (max_order, N, d) array in the
+        native case
+    '''
+    from gnn_lib import GNNLIB
+    if GNNLIB is not None and hasattr(GNNLIB.lib, 'WalkSums'):
+        return list(GNNLIB.WalkSums(bank, node_feat, max_order, num_threads=num_threads))
+    return walk_sums(block_adjacency(bank.indptr, bank.indices), node_feat, max_order)
+
+
+def combine(node_feat, walks, blocks):
+    '''
+        node_feat: (num_nodes, d) features X
+        walks: [A X, A^2 X, ...] up to the largest order in blocks
+        blocks: list of (weight, orders); each block contributes the d columns
+                weight * sum(A^k X for k in orders), order 0 being X itself
+
+        e.g. [(1, (0,)), (90, (1, 2, 3))] is [X | 90 * (AX + A^2X + A^3X)].
+        With integer valued features (one-hot tags) every walk sum is an exact
+        integer in float64, so the result is bit-identical to the Python loops
+        regardless of summation order.
+    '''
+    node_feat = np.asarray(node_feat, dtype=np.float64)
+    walks = [node_feat] + list(walks)
+    out = np.zeros((node_feat.shape[0], node_feat.shape[1] * len(blocks)))
+    d = node_feat.shape[1]
+    for b, (weight, orders) in enumerate(blocks):
+        block = walks[orders[0]].copy()
+        for k in orders[1:]:
+            block += walks[k]
+        if weight != 1:
+            block *= weight
+        out[:, b * d:(b + 1) * d] = block
+    return out
+
+
+def _max_order(blocks):
+    return max(max(orders) for _, orders in blocks)
+
+
+def aggregate(node_feat, adj, blocks):
+    '''
+        combine() of the walk sums of node_feat over adj (see block_adjacency),
+        rows of node_feat in the same order as adj
+    '''
+    node_feat = np.asarray(node_feat, dtype=np.float64)
+    return combine(node_feat, walk_sums(adj, node_feat, _max_order(blocks)), blocks)
+
+
+def aggregate_bank(node_feat, bank, blocks, num_threads=0):
+    '''
+        aggregate() over the graphs of a GraphBank, walk sums by bank_walk_sums;
+        node_feat must hold at least their nodes, in the same order, and extra
+        trailing rows are ignored
+    '''
+    node_feat = np.asarray(node_feat, dtype=np.float64)[:bank.num_nodes]
+    return combine(node_feat, bank_walk_sums(bank, node_feat, _max_order(blocks), num_threads), blocks)
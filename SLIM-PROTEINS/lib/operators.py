@@ -0,0 +1,103 @@
+import numpy as np
+import scipy.sparse as sp
+import torch
+
+NORM_SCHEMES = ('sym', 'rw', 'raw')
+
+
+def graph_adjacency(csr):
+    '''
+        0/1 scipy CSR adjacency of one graph from the (indptr, indices) of its
+        neighbour lists (graph-local ids, see GraphBank.graph_csr); a neighbour
+        listed twice is still a single edge
+    '''
+    indptr, indices = csr
+    n = len(indptr) - 1
+    a = sp.csr_matrix((np.ones(len(indices)), indices, indptr), shape=(n, n))
+    a.sum_duplicates()
+    a.data[:] = 1
+    return a
+
+
+def _inv_sqrt(x):
+    out = np.zeros_like(x)
+    np.power(x, -0.5, out=out, where=x > 0)
+    return out
+
+
+def normalize(a, scheme):
+    '''
+        sym: D^-1/2 A' D^-1/2 with A' = A scaled column-wise by 1/sqrt(sqrt(deg) + 0.001)
+             and D the row sums of A' (the recipe SLIM-PTC used to build densely)
+        rw:  D^-1 A
+        raw: A
+        nodes without neighbours get an all-zero row and column
+    '''
+    if scheme == 'raw':
+        return a
+    deg = np.asarray(a.sum(axis=1)).ravel()
+    if scheme == 'rw':
+        inv = np.zeros_like(deg)
+        np.divide(1.0, deg, out=inv, where=deg > 0)
+        return sp.diags(inv).dot(a).tocsr()
+    if scheme == 'sym':
+        a = a.dot(sp.diags(1.0 / np.sqrt(np.sqrt(deg) + 0.001)))
+        d = _inv_sqrt(np.asarray(a.sum(axis=1)).ravel())
+        return sp.diags(d).dot(a).dot(sp.diags(d)).tocsr()
+    raise ValueError('unknown adjacency normalization %s, expected one of %s' % (scheme, NORM_SCHEMES))
+
+
+def to_torch_sparse(m, device=None):
+    m = m.tocoo()
+    indices = torch.from_numpy(np.vstack((m.row, m.col)).astype(np.int64))
+    values = torch.from_numpy(m.data.astype(np.float32))
+    return torch.sparse_coo_tensor(indices, values, m.shape, device=device).coalesce()
+
+
+class OperatorCache(object):
+    '''
+        normalized adjacency of each graph and its requested powers, built the first
+        time a graph is used and kept sparse; none of it depends on trainable state
+
+        scheme: one of NORM_SCHEMES
+        powers: e.g. (1, 2, 3) for [K, K^2, K^3]
+        as_tensor: return torch sparse tensors on device instead of scipy CSR; both
+                   are float32
+    '''
+    def __init__(self, scheme='raw', powers=(1,), as_tensor=True, device=None):
+        assert scheme in NORM_SCHEMES, 'unknown adjacency normalization %s' % scheme
+        self.scheme = scheme
+        self.powers = tuple(powers)
+        self.as_tensor = as_tensor
+        self.device = device
+        self._banks = {}
+
+    def build(self, csr):
+        k = normalize(graph_adjacency(csr), self.scheme)
+        ops = []
+        cur, p = k, 1
+        for power in sorted(self.powers):
+            while p < power:
+                cur = cur.dot(k).tocsr()
+                p += 1
+            ops.append(cur)
+        ops = [ops[sorted(self.powers).index(power)] for power in self.powers]
+        if self.as_tensor:
+            ops = [to_torch_sparse(op, self.device) for op in ops]
+        else:
+            ops = [op.astype(np.float32) for op in ops]
+        return ops
+
+    def __call__(self, bank, i):
+        '''
+            operators of graph i of a GraphBank, one per requested power; caches are
+            kept per bank object, which is held so its id cannot be reused
+        '''
+        entry = self._banks.get(id(bank))
+        if entry is None or entry[0] is not bank:
+            entry = (bank, {})
+            self._banks[id(bank)] = entry
+        ops = entry[1].get(i)
+        if ops is None:
+            ops = entry[1][i] = self.build(bank.graph_csr(i))
+        return ops
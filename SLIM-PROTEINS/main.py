@@ -13,13 +13,19 @@ import math
 import pdb
 from predict import MLPClassifier, MLPRegression
 from sklearn import metrics
-from util import cmd_args, load_data
+from util import cmd_args, load_data, FeatureCache
 # from kmeans import Euclidean_space
 # from kmeansOK import Deep_kmeans
-from sklearn.cluster import KMeans
 from graphVec import graphVec
 from Clustering import Clustering
 from pytorch_util import weights_init, gnn_spmm
+from la_store import LAStore
+from la_precompute import graph_layout
+from graph_bank import GraphBank
+from operators import OperatorCache
+from center_init import init_centers
+from soft_assign import top_assignment, ScheduledAssignment
+from interaction import block_diag, batched_interaction, landmark_histogram
 
 
 class SLIM(nn.Module):
@@ -86,6 +92,8 @@ class Classifier(nn.Module):
                                  with_dropout=cmd_args.dropout)
         if regression:
             self.mlp = MLPRegression(input_size=out_dim, hidden_size=cmd_args.hidden, with_dropout=cmd_args.dropout)
+        self.feature_cache = FeatureCache(self.PrepareFeatureLabel)
+        self.operator_cache = OperatorCache(cmd_args.adj_norm or 'raw', device=cmd_args.device)
 
     def PrepareFeatureLabel(self, batch_graph):
         if self.regression:
@@ -116,7 +124,7 @@ class Classifier(nn.Module):
             labels[i] = batch_graph[i].label
             n_nodes += batch_graph[i].num_nodes
             if node_tag_flag == True:
-                concat_tag += batch_graph[i].node_tags
+                concat_tag.append(np.asarray(batch_graph[i].node_tags, dtype=np.int64))
             if node_feat_flag == True:
                 tmp = torch.from_numpy(batch_graph[i].node_features).type('torch.FloatTensor')
                 concat_feat.append(tmp)
@@ -126,7 +134,7 @@ class Classifier(nn.Module):
                     concat_edge_feat.append(tmp)
 
         if node_tag_flag == True:
-            concat_tag = torch.LongTensor(concat_tag).view(-1, 1)
+            concat_tag = torch.from_numpy(np.concatenate(concat_tag)).view(-1, 1)
             node_tag = torch.zeros(n_nodes, cmd_args.feat_dim)
             node_tag.scatter_(1, concat_tag, 1)
 
@@ -158,60 +166,32 @@ class Classifier(nn.Module):
 
     def forward(self,selected_idx, batch_graph,batch_graph_sub,adj_one,node_feat_all,q,u,bin1,g_list_test,pos,codestrain):
 
-        if len(batch_graph)==1002:
+        if pos >= len(batch_graph):
+            batch_graph = g_list_test
 
-           if pos < 1002:
-               batch_graph = batch_graph
-           else:
-               batch_graph = g_list_test
-        else:
-
-            batch_graph = batch_graph
-
-        feature_label = self.PrepareFeatureLabel(batch_graph)
-        feature_label_sub = self.PrepareFeatureLabel(batch_graph_sub)
-
-        if len(feature_label) == 2:
-            node_feat, labels = feature_label
-            edge_feat = None
-        elif len(feature_label) == 3:
-            node_feat, edge_feat, labels = feature_label
-        if len(feature_label_sub) == 2:
-                node_feat, labels1 = feature_label_sub
-                edge_feat = None
-        elif len(feature_label_sub) == 3:
-                node_feat, edge_feat, labels1 = feature_label_sub
-
-        count = 0
-        graph_sizesall = [batch_graph[i].num_nodes for i in range(len(batch_graph))]
-        for i in range(int(selected_idx[0])):
-            count = graph_sizesall[i] + count
-        count1 = graph_sizesall[int(selected_idx[0])] + count
-        deltacount=count1-count
-        adjsub = np.zeros([deltacount, deltacount])
-        for ii in range(deltacount):
-            for jj in range(len(adj_one[int(selected_idx[0])][ii])):
-                adjsub[ii][adj_one[int(selected_idx[0])][ii][jj]] = 1
-        q_sub=q[count:count1,:]
+        # features and labels of the whole list are built once and cached
+        feature_label = self.feature_cache(batch_graph)
+        labels = feature_label[-1]
+        # node rows of the selected graphs (slices of the graph bank) and their offsets within the batch
+        rows, batch_offsets = adj_one.batch_rows(selected_idx)
+        q_sub=q[torch.from_numpy(rows)]
+        if cmd_args.assign_topm:
+            # keep each node's top-m centers, the kernel then scatters O(m^2) per edge
+            q_sub = top_assignment(q_sub, cmd_args.assign_topm)
+        q_sub = q_sub.to(cmd_args.device)
 
         ##Get new features between clusters with waw/ppt(p==bin)
-        q_sub_bin = torch.sum(q_sub, 0)
-        bin=np.zeros((graph_sizesall[int(selected_idx[0])],num_centers))
-        bin = torch.from_numpy(bin).type(torch.FloatTensor)
-        bin = bin.cuda()
-        bin11=q_sub_bin
-        adjsub = torch.from_numpy(adjsub).type(torch.FloatTensor).cuda()
-        kz =adjsub
-        qk = torch.mm(q_sub.t(), kz)
-        qkq = torch.mm(qk, q_sub)
-        qkq=qkq[0]
+        bin = torch.zeros(len(rows), num_centers, device=cmd_args.device)
+        # [B, K] cluster histograms of the batch
+        bin11=landmark_histogram(q_sub, batch_offsets)
+        # block-diagonal adjacency of the batch, built once per graph and kept sparse
+        kz = block_diag([self.operator_cache(adj_one, int(i))[0] for i in selected_idx])
+        qkq, = batched_interaction(kz, q_sub, batch_offsets)
+        # first row of every graph's interactions, [B, 1, K]
+        qkq=qkq[:, :1]
         labels=labels[selected_idx]
         q_sub=q_sub
-        graph_sizesall = [batch_graph[i].num_nodes for i in range(len(batch_graph))]
-        count = 0
-        for i in range(int(selected_idx[0])):
-            count = graph_sizesall[i] + count
-        node_feat_all = node_feat_all[count:graph_sizesall[int(selected_idx[0])] + count, :]
+        node_feat_all = node_feat_all[rows, :]
         node_feat_all = torch.from_numpy(node_feat_all).type(torch.FloatTensor)
         return self.mlp(node_feat_all,bin,qkq,q_sub,bin11,labels)
 
@@ -259,18 +239,17 @@ def trainloop_dataset(node_feat_new6,wp,epoch,W,Uw,adj_one,g_list,adj_one_test,g
     if epoch==0:
        print("Clustering..")
        z31 = node_feat2
-       kmeans = KMeans(n_clusters=num_centers, n_init=80)
-       kmeans.fit_predict(z31.detach().numpy())
-       Uw = torch.from_numpy(kmeans.cluster_centers_).type(torch.FloatTensor)
-
-    kl_loss, q = Clustering(node_feat, Uw,Dict)
+       centers = init_centers(z31.detach().numpy(), num_centers, method=cmd_args.center_init, cache_dir=cmd_args.center_cache or None,
+                              seed=cmd_args.seed, n_init=80, coreset_size=cmd_args.coreset_size)
+       Uw = torch.from_numpy(centers).type(torch.FloatTensor)
 
+    # q[rows] is assigned batch by batch, the target distribution refreshed every -target_interval batches
+    q = ScheduledAssignment(node_feat.to(cmd_args.device), Uw.to(cmd_args.device), interval=cmd_args.target_interval, chunk=cmd_args.cluster_chunk)
 
-    loss1 =  kl_loss
 
     codestrain = []
     for pos in pbar:
-        if pos < 1002:
+        if pos * bsize < len(sample_idxes):
            selected_idx = sample_idxes[pos * bsize: (pos + 1) * bsize]
            batch_graph = [g_list[idx] for idx in selected_idx]
            targets = [g_list[idx].label for idx in selected_idx]
@@ -282,15 +261,17 @@ def trainloop_dataset(node_feat_new6,wp,epoch,W,Uw,adj_one,g_list,adj_one_test,g
         else:
             logits, loss, acc = classifier(selected_idx,g_list,batch_graph,adj_one,node_feat1,q,Uw,bin,g_list_test,pos,codestrain)
             all_scores.append(logits[:, 1].cpu().detach())  # for binary classification
-        loss1 = loss1.cuda()
+        # KL divergence on the nodes of this batch only
+        loss1 = q.kl_loss().to(cmd_args.device)
         ##klloss and classification loss
         loss=0.1*loss1+loss
 
 
         if optimizer is not None:
             optimizer.zero_grad()
-            loss.backward(retain_graph=True)
+            loss.backward()
             optimizer.step()
+            q.step()
 
         loss = loss.data.cpu().detach().numpy()
 
@@ -318,7 +299,6 @@ def trainloop_dataset(node_feat_new6,wp,epoch,W,Uw,adj_one,g_list,adj_one_test,g
 
 def testloop_dataset(node_feat_new6,Dict,W,Uw,test_idxes,adj_one,g_list, adj_one_train,g_list_train,classifier, sample_idxes,  optimizer=None, bsize=cmd_args.batch_size):
     total_loss = []
-    bsize=1
     total_iters = (len(sample_idxes) + (bsize - 1) * (optimizer is None)) // bsize
     pbar = tqdm(range(total_iters), unit='batch')
     all_targets = []
@@ -329,7 +309,7 @@ def testloop_dataset(node_feat_new6,Dict,W,Uw,test_idxes,adj_one,g_list, adj_one
     node_feat=node_feat_new6
     node_feat = torch.relu(node_feat)
 
-    node_feat = node_feat.cuda()
+    node_feat = node_feat.to(cmd_args.device)
 
     kl_loss, q = Clustering( node_feat, Uw,Dict)
     codes = np.argmax(q.cpu().detach().numpy(), 1)
@@ -383,6 +363,8 @@ if __name__ == '__main__':
     random.seed(cmd_args.seed)
     np.random.seed(cmd_args.seed)
     torch.manual_seed(cmd_args.seed)
+    if cmd_args.num_threads > 0:
+        torch.set_num_threads(cmd_args.num_threads)
 
     train_graphs, test_graphs ,adj_one,adj_one_test,test_idxes_real= load_data()
     print('# train: %d, # test: %d' % (len(train_graphs), len(test_graphs)))
@@ -414,6 +396,8 @@ if __name__ == '__main__':
     print("classifier.parameters()",classifier.parameters())
 
     train_idxes = list(range(len(train_graphs)))
+    num_train_nodes = adj_one.num_nodes
+    num_test_nodes = adj_one_test.num_nodes
     test_idxes = list(range(len(test_graphs)))
     best_loss = None
 
@@ -437,24 +421,12 @@ if __name__ == '__main__':
     node_feat1 = np.array(node_feat1)
     # node_feat_new2 = graphVec(node_feat, adj_one,adj_one_test)
     # node_feat_new2_test = graphVec(node_feat_test.cpu(),adj_one_test)
-    import pickle
-    file = open('1order_LA.pkl', 'rb')
-    LA1 = pickle.load(file)
-    file = open('2order_LA.pkl', 'rb')
-    LA2 = pickle.load(file)
-    file = open('3order_LA.pkl', 'rb')
-    LA3 = pickle.load(file)
-    file = open('4order_LA.pkl', 'rb')
-    LA4 = pickle.load(file)
-    file = open('5order_LA.pkl', 'rb')
-    LA5= pickle.load(file)
+    la_store = LAStore(cmd_args.la_dir, legacy='%dorder_LA')
+    # rows of this fold's graphs, in its train-then-test order
+    la_layout = graph_layout(train_graphs + test_graphs, GraphBank.concat([adj_one, adj_one_test]), cmd_args.feat_dim)
+    LA1, LA2, LA3, LA4, LA5 = [torch.from_numpy(np.asarray(la_store.load(k, layout=la_layout), dtype=np.float32)) for k in range(1, 6)]
 
     node_feat = torch.from_numpy(node_feat).type('torch.FloatTensor')
-    LA1 = torch.from_numpy(LA1).type('torch.FloatTensor')
-    LA2 = torch.from_numpy(LA2).type('torch.FloatTensor')
-    LA3 = torch.from_numpy(LA3).type('torch.FloatTensor')
-    LA4 = torch.from_numpy(LA4).type('torch.FloatTensor')
-    LA5 = torch.from_numpy(LA5).type('torch.FloatTensor')
 
     lr_scheduler = torch.optim.lr_scheduler.CosineAnnealingLR(optimizer,T_max =10, last_epoch=-1)
 
@@ -475,7 +447,9 @@ if __name__ == '__main__':
         print('\033[94maverage training of epoch %d: loss %.5f acc %.5f auc %.5f\033[0m' % (epoch, avg_loss[0], avg_loss[1], avg_loss[2]))
 
         classifier.eval()
-        test_loss = testloop_dataset(node_feat_new2[39486:43471],Dict,W,Uw,test_idxes_real,adj_one_test,test_graphs,adj_one,train_graphs, classifier, test_idxes,)
+        # evaluation only: no autograd graph, which also lets batched_interaction use libgnn's kernel
+        with torch.no_grad():
+            test_loss = testloop_dataset(node_feat_new2[num_train_nodes:num_train_nodes + num_test_nodes],Dict,W,Uw,test_idxes_real,adj_one_test,test_graphs,adj_one,train_graphs, classifier, test_idxes,)
         if not cmd_args.printAUC:
             test_loss[2] = 0.0
         print('\033[95maverage test of epoch %d: loss %.5f acc %.5f auc %.5f\033[0m' % (epoch, test_loss[0], test_loss[1], test_loss[2]))
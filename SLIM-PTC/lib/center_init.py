@@ -0,0 +1,94 @@
+import hashlib
+import os
+import numpy as np
+from sklearn.cluster import KMeans, MiniBatchKMeans
+
+INIT_METHODS = ('coreset', 'minibatch', 'kmeans')
+
+
+def _unique_rows(x):
+    '''
+        distinct rows of x in lexicographic order and how often each occurs; node
+        features built from one-hot tags repeat a lot, and k-means on the weighted
+        distinct rows has exactly the same objective as on x
+    '''
+    return np.unique(np.ascontiguousarray(x), axis=0, return_counts=True)
+
+
+def centers_key(rows, counts, k, method, params):
+    '''
+        hash of the (order invariant) feature multiset, K and the settings of the run
+    '''
+    h = hashlib.sha1()
+    h.update(('%s %s %d %s %r' % (rows.dtype.str, rows.shape, k, method, sorted(params.items()))).encode('ascii'))
+    h.update(rows.tobytes())
+    h.update(counts.astype(np.int64).tobytes())
+    return h.hexdigest()
+
+
+def lightweight_coreset(rows, weights, size, rng):
+    '''
+        importance sample of size rows: half uniform (by weight), half proportional
+        to the squared distance to the weighted mean; returns (rows, weights) whose
+        weighted k-means cost is an unbiased estimate of the full one
+    '''
+    mean = np.average(rows, axis=0, weights=weights)
+    dist = ((rows - mean) ** 2).sum(1) * weights
+    prob = 0.5 * weights / weights.sum()
+    if dist.sum() > 0:
+        prob = prob + 0.5 * dist / dist.sum()
+    else:
+        prob = 2 * prob
+    idx = rng.choice(len(rows), size=size, replace=True, p=prob)
+    return rows[idx], weights[idx] / (size * prob[idx])
+
+
+def init_centers(x, k, method='kmeans', cache_dir=None, seed=None, n_init=10, max_iter=300,
+                 coreset_size=10000, batch_size=4096):
+    '''
+        (k, d) float32 initial cluster centers of the rows of x
+
+        method: 'kmeans'    k-means++ seeded KMeans on all (distinct, weighted) rows
+                'coreset'   the same on a lightweight coreset of coreset_size rows
+                'minibatch' MiniBatchKMeans with batches of batch_size rows
+        cache_dir: if given, centers are stored there keyed on the feature multiset,
+                   k and the settings, and later runs with the same key (other folds
+                   seeing the same features, reruns) load them without clustering
+    '''
+    assert method in INIT_METHODS, 'unknown center initialization %s' % method
+    x = np.asarray(x)
+    rows, counts = _unique_rows(x)
+    params = {'seed': seed, 'n_init': n_init, 'max_iter': max_iter}
+    if method == 'coreset':
+        params['coreset_size'] = coreset_size
+    elif method == 'minibatch':
+        params['batch_size'] = batch_size
+    path = None
+    if cache_dir is not None:
+        path = os.path.join(cache_dir, 'centers-%s.npy' % centers_key(rows, counts, k, method, params))
+        if os.path.exists(path):
+            print('using cached cluster centers %s' % path)
+            return np.load(path)
+
+    weights = counts.astype(np.float64)
+    if len(rows) < k:
+        # fewer distinct points than clusters: let KMeans see the duplicates
+        rows, weights = x, np.ones(len(x))
+    if method == 'coreset' and len(rows) > coreset_size:
+        rng = np.random.RandomState(seed)
+        rows, weights = lightweight_coreset(rows, weights, coreset_size, rng)
+    if method == 'minibatch':
+        model = MiniBatchKMeans(n_clusters=k, n_init=n_init, max_iter=max_iter, batch_size=batch_size,
+                                random_state=seed)
+    else:
+        model = KMeans(n_clusters=k, n_init=n_init, max_iter=max_iter, random_state=seed)
+    model.fit(rows, sample_weight=weights)
+    centers = model.cluster_centers_.astype(np.float32)
+
+    if path is not None:
+        # folds run concurrently by cv_runner can all get here on a fresh checkout
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = '%s.tmp%d.npy' % (path[:-4], os.getpid())
+        np.save(tmp, centers)
+        os.replace(tmp, path)
+    return centers
@@ -0,0 +1,16 @@
+#ifndef KHOP_H
+#define KHOP_H
+
+/**
+ * walk sums A X, A^2 X, ..., A^max_order X of a block-diagonal CSR adjacency
+ * (A[i, j] = number of times j is listed in row i), written to out as
+ * max_order consecutive (num_nodes, dim) row-major blocks; graphs (the blocks
+ * node_offsets[g]:node_offsets[g + 1]) are split across num_threads threads
+ * (<= 0: one per core) and each row sums its neighbours in listed order
+ */
+void walk_sums(const int num_graphs, const long long* node_offsets,
+               const long long* indptr, const long long* indices,
+               const double* feat, const int dim, const int max_order,
+               double* out, int num_threads);
+
+#endif
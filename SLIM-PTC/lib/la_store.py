@@ -0,0 +1,187 @@
+import json
+import hashlib
+import os
+import pickle
+import zipfile
+import numpy as np
+
+from graph_bank import concat_ranges
+
+MANIFEST = 'manifest.json'
+STORE_VERSION = 1
+
+
+def layout_digest(hashes):
+    '''
+        identifies an ordered list of per-graph hashes
+    '''
+    return hashlib.sha1('\n'.join(hashes).encode('ascii')).hexdigest()
+
+
+class LAStore(object):
+    '''
+        landmark-aggregation (LA) features, one raw .npy per hop order plus a small
+        manifest.json describing them. Orders are memory-mapped on first use, so a
+        run only touches the orders and node ranges it actually reads.
+
+        root: store directory
+        legacy: optional name pattern of the old pickles, e.g. '%dorder_LA_PTC'; an
+                order missing from the store is imported once from <pattern>.pkl or,
+                without unzipping by hand, from the <pattern>.zip archive
+    '''
+    def __init__(self, root, legacy=None):
+        self.root = root
+        self.legacy = legacy
+        self.manifest = self._read_manifest()
+        self._arrays = {}
+
+    def _read_manifest(self):
+        path = os.path.join(self.root, MANIFEST)
+        if not os.path.exists(path):
+            return {'version': STORE_VERSION, 'orders': {}}
+        with open(path, 'r') as f:
+            manifest = json.load(f)
+        assert manifest['version'] == STORE_VERSION, 'unsupported LA store version %s' % manifest['version']
+        return manifest
+
+    def _write_manifest(self):
+        path = os.path.join(self.root, MANIFEST)
+        tmp = '%s.tmp%d' % (path, os.getpid())
+        with open(tmp, 'w') as f:
+            json.dump(self.manifest, f, indent=1, sort_keys=True)
+        os.replace(tmp, path)
+
+    def orders(self):
+        return sorted(int(k) for k in self.manifest['orders'])
+
+    def has(self, order):
+        return str(order) in self.manifest['orders']
+
+    def create(self, order, shape, dtype=np.float64):
+        '''
+            writable memory map for new features of one hop order, to be filled in
+            chunks and then passed to commit(); readers keep seeing the old copy
+        '''
+        os.makedirs(self.root, exist_ok=True)
+        tmp = os.path.join(self.root, 'order%d.tmp%d.npy' % (order, os.getpid()))
+        return np.lib.format.open_memmap(tmp, mode='w+', dtype=dtype, shape=tuple(shape))
+
+    def commit(self, order, array, source=None, layout=None):
+        '''
+            publish an array from create() as the order-th features
+
+            layout: optional (hashes, num_nodes) of the graphs the rows belong to,
+                    in row order, so later runs can reuse rows of unchanged graphs
+        '''
+        array.flush()
+        shape, dtype, tmp = list(array.shape), array.dtype.str, array.filename
+        del array
+        self._publish(order, tmp, shape, dtype, source, layout)
+
+    def add(self, order, features, source=None, layout=None):
+        '''
+            store the (num_nodes, dim) features of one hop order, replacing any old copy
+        '''
+        os.makedirs(self.root, exist_ok=True)
+        features = np.ascontiguousarray(features)
+        tmp = os.path.join(self.root, 'order%d.tmp%d.npy' % (order, os.getpid()))
+        np.save(tmp, features)
+        self._publish(order, tmp, list(features.shape), features.dtype.str, source, layout)
+
+    def _publish(self, order, tmp, shape, dtype, source, layout):
+        name = 'order%d.npy' % order
+        os.replace(tmp, os.path.join(self.root, name))
+        self._arrays.pop(order, None)
+        # re-read so entries added meanwhile by another process are kept
+        self.manifest = self._read_manifest()
+        layouts = self.manifest.setdefault('layouts', {})
+        digest = None
+        if layout is not None:
+            hashes, num_nodes = layout
+            digest = layout_digest(hashes)
+            layouts[digest] = {'hashes': list(hashes), 'num_nodes': [int(n) for n in num_nodes]}
+        self.manifest['orders'][str(order)] = {'file': name,
+                                               'shape': shape,
+                                               'dtype': dtype,
+                                               'source': source,
+                                               'layout': digest}
+        used = set(entry.get('layout') for entry in self.manifest['orders'].values())
+        for key in list(layouts):
+            if key not in used:
+                del layouts[key]
+        self._write_manifest()
+
+    def graph_rows(self, order):
+        '''
+            {graph hash: first row} for the order-th features; empty when the rows
+            were not written with a layout (e.g. imported from a legacy pickle)
+        '''
+        entry = self.manifest['orders'].get(str(order))
+        if entry is None or entry.get('layout') is None:
+            return {}
+        layout = self.manifest['layouts'][entry['layout']]
+        starts = np.zeros(len(layout['num_nodes']), dtype=np.int64)
+        starts[1:] = np.cumsum(layout['num_nodes'])[:-1]
+        return dict(zip(layout['hashes'], starts.tolist()))
+
+    def _import_legacy(self, order):
+        if self.legacy is None:
+            return False
+        name = self.legacy % order
+        if os.path.exists(name + '.pkl'):
+            with open(name + '.pkl', 'rb') as f:
+                features = pickle.load(f)
+            source = name + '.pkl'
+        elif os.path.exists(name + '.zip'):
+            with zipfile.ZipFile(name + '.zip') as archive:
+                with archive.open(name + '.pkl') as f:
+                    features = pickle.load(f)
+            source = name + '.zip'
+        else:
+            return False
+        print('importing %s into LA store %s' % (source, self.root))
+        self.add(order, np.asarray(features), source=source)
+        return True
+
+    def _align(self, order, features, layout):
+        '''
+            features of one hop order in the graph order of layout (hashes, num_nodes)
+        '''
+        hashes, num_nodes = layout
+        entry = self.manifest['orders'][str(order)]
+        if entry.get('layout') is None:
+            # imported pickles do not record their graphs, only their size can be checked
+            if features.shape[0] != sum(num_nodes):
+                raise ValueError('LA order %d in %s has %d rows for %d nodes' % (
+                    order, self.root, features.shape[0], sum(num_nodes)))
+            return features
+        if entry['layout'] == layout_digest(hashes):
+            return features
+        starts = self.graph_rows(order)
+        missing = sum(h not in starts for h in hashes)
+        if missing:
+            raise ValueError('LA order %d in %s lacks %d of %d graphs, run precompute_LA.py for them' % (
+                order, self.root, missing, len(hashes)))
+        return features[concat_ranges([starts[h] for h in hashes], num_nodes)]
+
+    def load(self, order, start=None, stop=None, layout=None):
+        '''
+            rows start:stop of the order-th LA features, as a read-only memory map
+
+            layout: optional (hashes, num_nodes) of the caller's graphs in its node
+                    order (la_precompute.graph_layout). Rows stored for another
+                    order, e.g. another fold, are gathered into it (a copy), and a
+                    graph the store does not hold raises ValueError.
+        '''
+        if order not in self._arrays:
+            if not self.has(order):
+                self.manifest = self._read_manifest()
+            if not self.has(order) and not self._import_legacy(order):
+                raise KeyError('LA order %d is neither in %s nor available as %s' % (
+                    order, self.root, self.legacy and self.legacy % order))
+            entry = self.manifest['orders'][str(order)]
+            self._arrays[order] = np.load(os.path.join(self.root, entry['file']), mmap_mode='r')
+        features = self._arrays[order]
+        if layout is not None:
+            features = self._align(order, features, layout)
+        return features[start:stop]
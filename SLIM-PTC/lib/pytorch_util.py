@@ -68,3 +68,52 @@ class MySpMM(torch.autograd.Function):
 
 def gnn_spmm(sp_mat, dense_mat):
     return MySpMM.apply(sp_mat, dense_mat)
+
+def fold_linear_chain(layers, rowwise=False):
+    '''
+        (weight, bias) of the single affine map equal to the nn.Linear layers
+        applied in order with no nonlinearity in between
+
+        rowwise: the first layer is applied to each row of a (rows, in) input and
+                 the result flattened before the next layer; the folded map then
+                 takes the flattened (rows * in) input
+    '''
+    first, rest = (layers[0], layers[1:]) if rowwise else (None, layers)
+    weight, bias = rest[0].weight, rest[0].bias
+    for layer in rest[1:]:
+        weight = torch.mm(layer.weight, weight)
+        bias = F.linear(bias, layer.weight, layer.bias)
+    if first is not None:
+        w = weight.reshape(weight.shape[0], -1, first.out_features)
+        bias = bias + torch.matmul(w, first.bias).sum(1)
+        weight = torch.matmul(w, first.weight).reshape(weight.shape[0], -1)
+    return weight, bias
+
+class FoldedLinear(object):
+    '''
+        inference stand-in for an activation-free chain of nn.Linear layers (see
+        fold_linear_chain): one GEMM with a weight folded on first use. The fold is
+        dropped when the layers load a state dict (their own or their owner's)
+        and when they move to another device; the owner calls invalidate() for any
+        other change, e.g. from its train()/eval() switch since optimizer steps
+        happen in train mode, or after editing the weights in place.
+    '''
+    def __init__(self, layers, rowwise=False):
+        self.layers = layers
+        self.rowwise = rowwise
+        for layer in layers:
+            layer.register_load_state_dict_post_hook(self._loaded)
+        self.invalidate()
+
+    def invalidate(self):
+        self.weight = self.bias = None
+
+    def _loaded(self, module, incompatible_keys):
+        self.invalidate()
+
+    def __call__(self, x):
+        # also refold after the layers were moved to another device
+        if self.weight is None or self.weight.device != self.layers[0].weight.device:
+            with torch.no_grad():
+                self.weight, self.bias = fold_linear_chain(self.layers, self.rowwise)
+        return F.linear(x, self.weight, self.bias)
@@ -0,0 +1,137 @@
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+
+def squared_distances(z, centers):
+    '''
+        (n, K) squared euclidean distances ||z||^2 - 2 z U^T + ||U||^2, a single GEMM
+        instead of the (n, K, d) tensor of differences
+    '''
+    d = (z * z).sum(1, keepdim=True) - 2 * torch.mm(z, centers.t()) + (centers * centers).sum(1)
+    # the expansion can go slightly negative through cancellation
+    return d.clamp(min=0)
+
+
+def soft_assignment(z, centers, alpha=1.0, chunk=None):
+    '''
+        DEC soft assignment: Student-t kernel between nodes z (n, d) and centers (K, d),
+        normalized over the centers; gradients flow to both arguments
+
+        chunk: nodes processed at a time, bounding the temporaries to (chunk, K);
+               None or 0 does all nodes at once
+    '''
+    dtype = torch.promote_types(z.dtype, centers.dtype)
+    z, centers = z.to(dtype), centers.to(dtype)
+    chunk = chunk or max(z.shape[0], 1)
+    out = [z.new_zeros(0, centers.shape[0])]
+    for start in range(0, z.shape[0], chunk):
+        q = 1.0 / (1.0 + squared_distances(z[start:start + chunk], centers) / alpha)
+        q = q.pow((alpha + 1.0) / 2.0)
+        out.append(q / q.sum(1, keepdim=True))
+    return torch.cat(out, 0) if len(out) > 2 else out[-1]
+
+
+def target_distribution(q):
+    weight = q ** 2 / q.sum(0)
+    return (weight.t() / weight.sum(1)).t()
+
+
+def kl_divergence(q, p):
+    '''
+        DEC loss KL(p || q) averaged over all n * K entries. This is the scale of
+        F.kl_div's old default reduction='mean' that the 0.1 loss weight was tuned
+        with, kept on purpose: the per-node KL (reduction='batchmean') is K times
+        larger.
+    '''
+    return F.kl_div(q.log(), p, reduction='none').mean()
+
+
+class ScheduledAssignment(object):
+    '''
+        DEC soft assignment of the nodes z to the centers for a training loop that
+        only ever looks at one batch of nodes at a time
+
+        The target distribution p needs the column sums of q over all nodes; it is
+        recomputed without autograd by refresh(), at construction and then every
+        interval calls to step() (0: never again). Indexing, q[rows], computes the
+        assignment of just those rows from the current centers, with gradients,
+        and kl_loss() is the KL divergence to p on the rows indexed last. A step
+        thus costs O(batch K d) and its autograd graph is freed by backward().
+    '''
+    def __init__(self, z, centers, interval=0, alpha=1.0, chunk=None):
+        self.z = z
+        self.centers = centers
+        self.interval = interval
+        self.alpha = alpha
+        self.chunk = chunk
+        self.steps = 0
+        self.last = None
+        self.refresh()
+
+    def refresh(self):
+        with torch.no_grad():
+            self.p = target_distribution(soft_assignment(self.z, self.centers, self.alpha, self.chunk))
+
+    def step(self):
+        self.steps += 1
+        if self.interval and self.steps % self.interval == 0:
+            self.refresh()
+
+    def __getitem__(self, rows):
+        rows = torch.as_tensor(rows, device=self.z.device)
+        q = soft_assignment(self.z[rows], self.centers, self.alpha, self.chunk)
+        self.last = (rows, q)
+        return q
+
+    def kl_loss(self):
+        rows, q = self.last
+        return kl_divergence(q, self.p[rows])
+
+
+class TopAssignment(object):
+    '''
+        sparse soft assignment keeping each node's m strongest centers, in ELL layout:
+        index (n, m) center ids and value (n, m) weights renormalized to sum to one;
+        both torch tensors or both numpy arrays
+    '''
+    def __init__(self, index, value, num_centers):
+        self.index = index
+        self.value = value
+        self.num_centers = num_centers
+
+    @property
+    def shape(self):
+        return (self.index.shape[0], self.num_centers)
+
+    def __len__(self):
+        return self.index.shape[0]
+
+    def __getitem__(self, rows):
+        return TopAssignment(self.index[rows], self.value[rows], self.num_centers)
+
+    def to(self, device):
+        return TopAssignment(self.index.to(device), self.value.to(device), self.num_centers)
+
+    def to_dense(self):
+        n, m = self.index.shape
+        if isinstance(self.value, torch.Tensor):
+            out = self.value.new_zeros(n, self.num_centers)
+            return out.scatter(1, self.index, self.value)
+        out = np.zeros((n, self.num_centers), dtype=self.value.dtype)
+        np.put_along_axis(out, self.index, self.value, axis=1)
+        return out
+
+
+def top_assignment(q, m):
+    '''
+        TopAssignment of the dense (n, K) assignment q, torch (differentiable in the
+        kept values) or numpy
+    '''
+    m = min(m, q.shape[1])
+    if isinstance(q, torch.Tensor):
+        value, index = q.topk(m, dim=1)
+        return TopAssignment(index, value / value.sum(1, keepdim=True), q.shape[1])
+    index = np.argpartition(-q, m - 1, axis=1)[:, :m]
+    value = np.take_along_axis(q, index, axis=1)
+    return TopAssignment(index, value / value.sum(1, keepdims=True), q.shape[1])
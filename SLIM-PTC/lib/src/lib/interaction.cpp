@@ -0,0 +1,74 @@
+#include "interaction.h"
+#include <algorithm>
+#include <atomic>
+#include <thread>
+#include <vector>
+
+void batched_interaction(const int num_graphs, const long long* node_offsets,
+                         const long long* edge_offsets, const long long* rows,
+                         const long long* cols, const float* weights,
+                         const float* left, const float* right, const int K,
+                         float* out, int num_threads)
+{
+    std::atomic<int> next_graph(0);
+    auto worker = [&]() {
+        // y = A_g R_g, then out[g] = L_g^T y: O(|E_g| K + n_g K^2) per graph
+        std::vector<float> y, acc;
+        int g;
+        while ((g = next_graph.fetch_add(1)) < num_graphs)
+        {
+            const long long n0 = node_offsets[g], n = node_offsets[g + 1] - n0;
+            y.assign(n * K, 0.0f);
+            acc.assign((size_t)K * K, 0.0f);
+            for (long long e = edge_offsets[g]; e < edge_offsets[g + 1]; ++e)
+            {
+                float* __restrict__ dst = y.data() + (rows[e] - n0) * K;
+                const float* src = right + cols[e] * K;
+                const float w = weights[e];
+                for (int b = 0; b < K; ++b)
+                    dst[b] += w * src[b];
+            }
+            // four rows of L_g and Y at a time, so each row of out is loaded and
+            // stored once per four rank-one updates
+            long long i = 0;
+            for (; i + 4 <= n; i += 4)
+            {
+                const float* l = left + (n0 + i) * K;
+                const float* __restrict__ y0 = y.data() + i * K;
+                const float* __restrict__ y1 = y0 + K;
+                const float* __restrict__ y2 = y1 + K;
+                const float* __restrict__ y3 = y2 + K;
+                for (int a = 0; a < K; ++a)
+                {
+                    const float l0 = l[a], l1 = l[K + a], l2 = l[2 * K + a], l3 = l[3 * K + a];
+                    float* __restrict__ row = acc.data() + (size_t)a * K;
+                    for (int b = 0; b < K; ++b)
+                        row[b] += l0 * y0[b] + l1 * y1[b] + l2 * y2[b] + l3 * y3[b];
+                }
+            }
+            for (; i < n; ++i)
+            {
+                const float* l = left + (n0 + i) * K;
+                const float* __restrict__ yi = y.data() + i * K;
+                for (int a = 0; a < K; ++a)
+                {
+                    const float la = l[a];
+                    float* __restrict__ row = acc.data() + (size_t)a * K;
+                    for (int b = 0; b < K; ++b)
+                        row[b] += la * yi[b];
+                }
+            }
+            std::copy(acc.begin(), acc.end(), out + (size_t)g * K * K);
+        }
+    };
+
+    if (num_threads <= 0)
+        num_threads = std::max(1u, std::thread::hardware_concurrency());
+    num_threads = std::min(num_threads, std::max(num_graphs, 1));
+    std::vector<std::thread> threads;
+    for (int t = 1; t < num_threads; ++t)
+        threads.emplace_back(worker);
+    worker();
+    for (auto& t : threads)
+        t.join();
+}
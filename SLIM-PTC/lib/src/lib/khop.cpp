@@ -0,0 +1,50 @@
+#include "khop.h"
+#include <algorithm>
+#include <atomic>
+#include <thread>
+#include <vector>
+
+void walk_sums(const int num_graphs, const long long* node_offsets,
+               const long long* indptr, const long long* indices,
+               const double* feat, const int dim, const int max_order,
+               double* out, int num_threads)
+{
+    const long long num_nodes = node_offsets[num_graphs];
+    const long long block = num_nodes * dim;
+
+    // a graph's rows only read rows of the same graph, so every thread runs all
+    // orders of its graphs without waiting for the others
+    std::atomic<int> next_graph(0);
+    auto worker = [&]() {
+        int g;
+        while ((g = next_graph.fetch_add(1)) < num_graphs)
+        {
+            for (int k = 0; k < max_order; ++k)
+            {
+                const double* prev = k ? out + (k - 1) * block : feat;
+                double* cur = out + k * block;
+                for (long long i = node_offsets[g]; i < node_offsets[g + 1]; ++i)
+                {
+                    double* row = cur + i * dim;
+                    std::fill(row, row + dim, 0.0);
+                    for (long long p = indptr[i]; p < indptr[i + 1]; ++p)
+                    {
+                        const double* src = prev + indices[p] * dim;
+                        for (int c = 0; c < dim; ++c)
+                            row[c] += src[c];
+                    }
+                }
+            }
+        }
+    };
+
+    if (num_threads <= 0)
+        num_threads = std::max(1u, std::thread::hardware_concurrency());
+    num_threads = std::min(num_threads, std::max(num_graphs, 1));
+    std::vector<std::thread> threads;
+    for (int t = 1; t < num_threads; ++t)
+        threads.emplace_back(worker);
+    worker();
+    for (auto& t : threads)
+        t.join();
+}
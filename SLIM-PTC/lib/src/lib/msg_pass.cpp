@@ -1,4 +1,8 @@
 #include "msg_pass.h"
+#include <algorithm>
+#include <atomic>
+#include <mutex>
+#include <thread>
 
 void n2n_construct(GraphStruct* graph, long long* idxes, Dtype* vals)
 {
@@ -103,3 +107,121 @@ void subg_construct(GraphStruct* graph, long long* idxes, Dtype* vals)
 	}	
 	assert(nnz == (int)graph->num_nodes);	
 }
+
+
+// scratch of batch_construct, kept between calls so repeated batches reuse its
+// allocations; calls are serialized on the lock
+static std::vector<long long> pool_node_offset, pool_edge_offset;
+static std::vector< std::vector<long long> > pool_cursor;
+static std::mutex pool_lock;
+
+void batch_construct(const int num_graphs,
+                     const int* num_nodes,
+                     const int* num_edges,
+                     void** list_of_edge_pairs,
+                     long long** rows,
+                     long long** cols,
+                     long long** crows,
+                     Dtype** vals,
+                     int num_threads)
+{
+    std::lock_guard<std::mutex> guard(pool_lock);
+    // node and edge offsets of every graph; all in-edges of a graph's nodes come
+    // from its own edge pairs, so each graph owns a contiguous slice of every output
+    std::vector<long long>& node_offset = pool_node_offset;
+    std::vector<long long>& edge_offset = pool_edge_offset;
+    node_offset.assign(num_graphs + 1, 0);
+    edge_offset.assign(num_graphs + 1, 0);
+    for (int i = 0; i < num_graphs; ++i)
+    {
+        node_offset[i + 1] = node_offset[i] + num_nodes[i];
+        edge_offset[i + 1] = edge_offset[i] + 2 * (long long)num_edges[i];
+    }
+    if (crows)
+    {
+        crows[0][0] = crows[1][0] = crows[2][0] = 0;
+        for (int i = 0; i < num_graphs; ++i)
+            crows[2][i + 1] = node_offset[i + 1];
+    }
+
+    std::atomic<int> next_graph(0);
+    auto worker = [&](int t) {
+        std::vector<long long>& cursor = pool_cursor[t];
+        int i;
+        while ((i = next_graph.fetch_add(1)) < num_graphs)
+        {
+            const int* edge_pairs = static_cast<const int*>(list_of_edge_pairs[i]);
+            const long long n0 = node_offset[i], e0 = edge_offset[i];
+
+            // in-degrees, then the first nnz slot of each node, in node order
+            cursor.assign(num_nodes[i] + 1, 0);
+            for (int j = 0; j < num_edges[i] * 2; j += 2)
+            {
+                cursor[edge_pairs[j + 1] + 1]++;
+                cursor[edge_pairs[j] + 1]++;
+            }
+            for (int v = 0; v < num_nodes[i]; ++v)
+                cursor[v + 1] += cursor[v];
+            if (crows)
+            {
+                for (int v = 0; v < num_nodes[i]; ++v)
+                    crows[0][n0 + v + 1] = crows[1][n0 + v + 1] = e0 + cursor[v + 1];
+            }
+
+            // edge 2j is x->y and 2j+1 is y->x, appended to the in-lists of y and x
+            // in the order PrepareBatchGraph adds them
+            for (int j = 0; j < num_edges[i]; ++j)
+            {
+                int x = edge_pairs[2 * j], y = edge_pairs[2 * j + 1];
+                int dst[2] = {y, x}, src[2] = {x, y};
+                for (int k = 0; k < 2; ++k)
+                {
+                    long long nnz = e0 + cursor[dst[k]]++;
+                    if (rows)
+                        rows[0][nnz] = rows[1][nnz] = n0 + dst[k];
+                    cols[0][nnz] = n0 + src[k];
+                    cols[1][nnz] = e0 + 2 * j + k;
+                }
+            }
+            if (crows)
+            {
+                // torch.sparse_csr wants the columns of a row sorted; the values of a
+                // row are all equal, and e2n's edge ids already come in order
+                for (int v = 0; v < num_nodes[i]; ++v)
+                    std::sort(cols[0] + e0 + (v ? cursor[v - 1] : 0), cols[0] + e0 + cursor[v]);
+            }
+            if (cfg::msg_average)
+            {
+                for (int v = 0; v < num_nodes[i]; ++v)
+                {
+                    long long begin = v ? cursor[v - 1] : 0, end = cursor[v];
+                    for (long long p = begin; p < end; ++p)
+                        vals[0][e0 + p] = vals[1][e0 + p] = 1.0 / (end - begin);
+                }
+            } else {
+                std::fill(vals[0] + e0, vals[0] + edge_offset[i + 1], (Dtype)1.0);
+                std::fill(vals[1] + e0, vals[1] + edge_offset[i + 1], (Dtype)1.0);
+            }
+
+            for (int v = 0; v < num_nodes[i]; ++v)
+            {
+                if (rows)
+                    rows[2][n0 + v] = i;
+                cols[2][n0 + v] = n0 + v;
+                vals[2][n0 + v] = cfg::msg_average ? 1.0 / num_nodes[i] : 1.0;
+            }
+        }
+    };
+
+    if (num_threads <= 0)
+        num_threads = std::max(1u, std::thread::hardware_concurrency());
+    num_threads = std::min(num_threads, std::max(num_graphs, 1));
+    if ((int)pool_cursor.size() < num_threads)
+        pool_cursor.resize(num_threads);
+    std::vector<std::thread> threads;
+    for (int t = 1; t < num_threads; ++t)
+        threads.emplace_back(worker, t);
+    worker(0);
+    for (auto& t : threads)
+        t.join();
+}
@@ -68,34 +68,34 @@ IMDBMULTI)
   ;;
 esac
 
+# every fold holds all graphs and LA rows are looked up by graph hash, so one
+# store serves all folds; precompute_LA.py only computes graphs it does not hold
+precompute_la() {
+  if [ -f precompute_LA.py ]; then
+    python precompute_LA.py -data $DATA -fold $1 -la_dir LA_store
+  fi
+}
+
 if [ ${fold} == 0 ]; then
   echo "Running 10-fold cross validation"
-  start=`date +%s`
-  for i in $(seq 1 10)
-  do
-    CUDA_VISIBLE_DEVICES=${GPU} python main.py \
-        -seed 1 \
-        -data $DATA \
-        -fold $i \
-        -learning_rate $learning_rate \
-        -num_epochs $num_epochs \
-        -hidden $n_hidden \
-        -latent_dim $CONV_SIZE \
-        -sortpooling_k $sortpooling_k \
-        -out_dim $FP_LEN \
-        -batch_size $bsize \
-        -gm $gm \
-        -mode $gpu_or_cpu \
-        -dropout $dropout
-  done
-  stop=`date +%s`
-  echo "End of cross-validation"
-  echo "The total running time is $[stop - start] seconds."
-  echo "The accuracy results for ${DATA} are as follows:"
-  cat acc_results.txt
-  echo "Average accuracy is"
-  tail -10 acc_results.txt | awk '{ sum += $1; n++ } END { if (n > 0) print sum / n; }'
+  precompute_la 1
+  # all folds at once in one driver; per-fold logs go to cv_logs/, the record to cv_results.json
+  CUDA_VISIBLE_DEVICES=${GPU} python cross_validate.py \
+      -seed 1 \
+      -data $DATA \
+      -learning_rate $learning_rate \
+      -num_epochs $num_epochs \
+      -hidden $n_hidden \
+      -latent_dim $CONV_SIZE \
+      -sortpooling_k $sortpooling_k \
+      -out_dim $FP_LEN \
+      -batch_size $bsize \
+      -gm $gm \
+      -mode $gpu_or_cpu \
+      -dropout $dropout \
+      -la_dir LA_store
 else
+  precompute_la ${fold}
   CUDA_VISIBLE_DEVICES=${GPU} python main.py \
       -seed 1 \
       -data $DATA \
@@ -110,5 +110,6 @@ else
       -gm $gm \
       -mode $gpu_or_cpu \
       -dropout $dropout \
+      -la_dir LA_store \
       -test_number ${test_number}
 fi
@@ -0,0 +1,73 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# the lib folders of the four datasets are kept identical, the tests run on SLIM-PTC's
+LIB_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'SLIM-PTC', 'lib')
+sys.path.insert(0, LIB_DIR)
+
+
+def random_adj_lists(rng, num_graphs, max_nodes=12, repeats=True):
+    '''
+        per-graph neighbour lists in graph-local ids as util._parse_data reads them:
+        undirected edges, some isolated nodes and, with repeats, a few neighbours
+        listed twice
+    '''
+    graphs = []
+    for _ in range(num_graphs):
+        n = rng.randint(1, max_nodes + 1)
+        nbrs = [[] for _ in range(n)]
+        for _ in range(rng.randint(0, 2 * n + 1)):
+            a, b = rng.randint(0, n, 2)
+            if a != b:
+                nbrs[a].append(b)
+                nbrs[b].append(a)
+                if not repeats and nbrs[a].count(b) > 1:
+                    nbrs[a].pop()
+                    nbrs[b].pop()
+        graphs.append([[int(v) for v in adj] for adj in nbrs])
+    return graphs
+
+
+def dense_adjacency(adj_lists):
+    '''
+        block-diagonal dense A of the graphs, A[i, j] counting how often j is listed for i
+    '''
+    n = sum(len(adj) for adj in adj_lists)
+    out = np.zeros((n, n))
+    base = 0
+    for adj in adj_lists:
+        for i, nbrs in enumerate(adj):
+            for j in nbrs:
+                out[base + i, base + j] += 1
+        base += len(adj)
+    return out
+
+
+@pytest.fixture
+def rng():
+    return np.random.RandomState(0)
+
+
+def _native(symbol):
+    from gnn_lib import GNNLIB
+    if GNNLIB is None or not hasattr(GNNLIB.lib, symbol):
+        pytest.skip('libgnn is not built with %s (run make in SLIM-PTC/lib)' % symbol)
+    return GNNLIB
+
+
+@pytest.fixture
+def walk_sums_lib():
+    return _native('WalkSums')
+
+
+@pytest.fixture
+def interaction_lib():
+    return _native('BatchedInteraction')
+
+
+@pytest.fixture
+def sparse_lib():
+    return _native('PrepareSparseMatricesThreaded')
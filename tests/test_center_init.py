@@ -0,0 +1,89 @@
+import multiprocessing as mp
+import os
+
+import numpy as np
+import pytest
+from sklearn.cluster import KMeans
+
+from center_init import _unique_rows, init_centers
+
+
+def tagged_rows(rng, n=400, tags=6):
+    '''
+        one-hot node tags, the heavily repeated features init_centers is fed
+    '''
+    return np.eye(tags)[rng.randint(0, tags, n)]
+
+
+def test_unique_rows_counts_repeats(rng):
+    x = tagged_rows(rng)
+    rows, counts = _unique_rows(x)
+    assert len(rows) == 6 and counts.sum() == len(x)
+    for row, count in zip(rows, counts):
+        assert count == (x == row).all(1).sum()
+
+
+def test_weighted_kmeans_has_the_full_objective(rng):
+    x = tagged_rows(rng) + 0.01 * rng.randn(1, 6)
+    centers = init_centers(x, 3, method='kmeans', seed=0)
+    full = KMeans(n_clusters=3, n_init=10, random_state=0).fit(x)
+    cost = ((x[:, None, :] - centers[None]) ** 2).sum(2).min(1).sum()
+    assert cost <= full.inertia_ * (1 + 1e-4) + 1e-6
+
+
+@pytest.mark.parametrize('method', ['coreset', 'minibatch', 'kmeans'])
+def test_shape_dtype_and_seeding(rng, method):
+    x = rng.randn(300, 4)
+    centers = init_centers(x, 5, method=method, seed=1, coreset_size=100, batch_size=64)
+    assert centers.shape == (5, 4) and centers.dtype == np.float32
+    np.testing.assert_array_equal(centers, init_centers(x, 5, method=method, seed=1, coreset_size=100,
+                                                        batch_size=64))
+
+
+@pytest.mark.filterwarnings('ignore::sklearn.exceptions.ConvergenceWarning')
+def test_fewer_distinct_rows_than_clusters(rng):
+    x = tagged_rows(rng, tags=2)
+    assert init_centers(x, 4, seed=0).shape == (4, 2)
+
+
+def test_cache_hit_ignores_row_order(rng, tmp_path, capsys):
+    x = rng.randn(200, 3)
+    centers = init_centers(x, 4, cache_dir=str(tmp_path), seed=0)
+    assert len(os.listdir(str(tmp_path))) == 1
+    # another fold sees the same features in another order
+    cached = init_centers(x[rng.permutation(len(x))], 4, cache_dir=str(tmp_path), seed=0)
+    assert 'using cached cluster centers' in capsys.readouterr().out
+    np.testing.assert_array_equal(cached, centers)
+    # other settings are another entry
+    init_centers(x, 4, cache_dir=str(tmp_path), seed=1)
+    assert len(os.listdir(str(tmp_path))) == 2
+
+
+def _fold(barrier, x, cache_dir, out):
+    makedirs = os.makedirs
+
+    def racing_makedirs(*args, **kwargs):
+        # both folds are done clustering and create the directory together
+        barrier.wait()
+        return makedirs(*args, **kwargs)
+
+    os.makedirs = racing_makedirs
+    np.save(out, init_centers(x, 4, cache_dir=cache_dir, seed=0))
+
+
+def test_concurrent_folds_share_a_new_cache_dir(rng, tmp_path):
+    # cv_runner's folds all cluster the same features and find the cache missing
+    x = rng.randn(200, 3)
+    cache_dir = str(tmp_path / 'center_cache')
+    ctx = mp.get_context('spawn')
+    barrier = ctx.Barrier(2)
+    outs = [str(tmp_path / ('fold%d.npy' % i)) for i in range(2)]
+    procs = [ctx.Process(target=_fold, args=(barrier, x, cache_dir, out)) for out in outs]
+    for proc in procs:
+        proc.start()
+    for proc in procs:
+        proc.join()
+    assert [proc.exitcode for proc in procs] == [0, 0]
+    np.testing.assert_array_equal(np.load(outs[0]), np.load(outs[1]))
+    names = os.listdir(cache_dir)
+    assert len(names) == 1 and names[0].startswith('centers-') and '.tmp' not in names[0]
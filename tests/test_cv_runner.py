@@ -0,0 +1,42 @@
+import json
+import os
+
+import numpy as np
+
+from cv_runner import cross_validate, write_record
+
+SCRIPT = '''import argparse
+import os
+
+parser = argparse.ArgumentParser()
+parser.add_argument('-fold', type=int)
+parser.add_argument('-num_threads', type=int)
+parser.add_argument('-la_dir')
+args = parser.parse_args()
+print('threads', os.environ['OMP_NUM_THREADS'], args.num_threads)
+test_loss = [0.5, args.fold / 10.0, 0.9]
+assert args.la_dir == 'LA_store/fold%d' % args.fold
+'''
+
+
+def test_cross_validate_runs_every_fold(tmp_path):
+    script = tmp_path / 'fake_main.py'
+    script.write_text(SCRIPT)
+    log_dir = str(tmp_path / 'logs')
+    record = cross_validate(str(script), ['-la_dir', 'LA_store/fold{fold}'], folds=[1, 2, 3], workers=2,
+                            log_dir=log_dir)
+
+    assert [r['fold'] for r in record['folds']] == [1, 2, 3]
+    assert [r['acc'] for r in record['folds']] == [0.1, 0.2, 0.3]
+    assert np.isclose(record['acc_mean'], 0.2) and np.isclose(record['acc_std'], np.std([0.1, 0.2, 0.3]))
+    assert record['workers'] == 2 and record['argv'] == ['-la_dir', 'LA_store/fold{fold}']
+    threads = record['threads_per_worker']
+    for fold in (1, 2, 3):
+        with open(os.path.join(log_dir, 'fold%d.log' % fold)) as f:
+            assert f.read().strip() == 'threads %d %d' % (threads, threads)
+
+    path = str(tmp_path / 'cv.json')
+    write_record(record, path)
+    with open(path) as f:
+        assert json.load(f) == record
+    assert not [name for name in os.listdir(str(tmp_path)) if '.tmp' in name]
@@ -0,0 +1,142 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+from conftest import LIB_DIR, random_adj_lists
+
+# the dataset cache lives in util.py, identical in the four dataset folders
+sys.path.insert(0, os.path.dirname(LIB_DIR))
+import util
+
+NUM_GRAPHS = 20
+
+
+def write_dataset(rng, with_attr=False):
+    '''
+        data/TOY/TOY.txt in the format util._parse_data reads, plus fold 1's split
+    '''
+    lines = ['%d' % NUM_GRAPHS]
+    for adj in random_adj_lists(rng, NUM_GRAPHS, repeats=False):
+        lines.append('%d %d' % (len(adj), rng.randint(0, 2)))
+        for nbrs in adj:
+            row = [rng.randint(0, 5), len(nbrs)] + nbrs
+            attr = ['%.3f' % a for a in rng.randn(2)] if with_attr else []
+            lines.append(' '.join([str(x) for x in row] + attr))
+    os.makedirs('data/TOY/10fold_idx')
+    with open('data/TOY/TOY.txt', 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    idx = rng.permutation(NUM_GRAPHS)
+    np.savetxt('data/TOY/10fold_idx/train_idx-1.txt', idx[:15], fmt='%d')
+    np.savetxt('data/TOY/10fold_idx/test_idx-1.txt', idx[15:], fmt='%d')
+
+
+@pytest.fixture
+def toy(tmp_path, monkeypatch):
+    '''
+        run in an empty folder with load_data() set to fold 1 of TOY; returns the
+        cache directory
+    '''
+    monkeypatch.chdir(tmp_path)
+    for name, value in (('data', 'TOY'), ('fold', 1), ('test_number', 0), ('data_cache', 1)):
+        monkeypatch.setattr(util.cmd_args, name, value)
+    return os.path.join('data', 'TOY', 'TOY.cache')
+
+
+def load(capsys, data_cache=1):
+    util.cmd_args.data_cache = data_cache
+    loaded = util.load_data()
+    return loaded, 'using cached dataset' in capsys.readouterr().out
+
+
+def assert_same_data(got, want):
+    for graphs, expected in zip(got[:2], want[:2]):
+        assert len(graphs) == len(expected)
+        for g, e in zip(graphs, expected):
+            assert (g.label, g.num_nodes, g.num_edges) == (e.label, e.num_nodes, e.num_edges)
+            np.testing.assert_array_equal(g.node_tags, e.node_tags)
+            np.testing.assert_array_equal(g.degs, e.degs)
+            np.testing.assert_array_equal(g.edge_pairs, e.edge_pairs)
+            if e.node_features is None:
+                assert g.node_features is None
+            else:
+                np.testing.assert_array_equal(g.node_features, e.node_features)
+    for bank, expected in zip(got[2:4], want[2:4]):
+        for name in ('indptr', 'indices', 'node_offsets'):
+            np.testing.assert_array_equal(getattr(bank, name), getattr(expected, name))
+    assert got[4] == want[4]
+
+
+def versions(cache_dir):
+    return sorted(name for name in os.listdir(cache_dir) if name != util.CACHE_POINTER)
+
+
+@pytest.mark.parametrize('with_attr', [False, True])
+def test_cache_roundtrip_matches_a_fresh_parse(toy, capsys, rng, with_attr):
+    write_dataset(rng, with_attr)
+    fresh, hit = load(capsys, data_cache=0)
+    assert not hit and not os.path.exists(toy)
+    written, hit = load(capsys)
+    assert not hit
+    cached, hit = load(capsys)
+    assert hit
+    assert_same_data(written, fresh)
+    assert_same_data(cached, fresh)
+    assert len(versions(toy)) == 1
+
+
+def test_rebuild_after_version_or_source_change(toy, capsys, rng, monkeypatch):
+    write_dataset(rng)
+    load(capsys)
+    old = versions(toy)
+
+    # only touched: the content hash still matches
+    os.utime('data/TOY/TOY.txt', None)
+    assert load(capsys)[1]
+
+    monkeypatch.setattr(util, 'CACHE_VERSION', util.CACHE_VERSION + 1)
+    assert not load(capsys)[1]
+    assert versions(toy) != old and len(versions(toy)) == 1
+    assert load(capsys)[1]
+
+    with open('data/TOY/TOY.txt') as f:
+        lines = f.read().split('\n')
+    # relabel the first graph
+    n, label = lines[1].split()
+    lines[1] = '%s %d' % (n, 1 - int(label))
+    with open('data/TOY/TOY.txt', 'w') as f:
+        f.write('\n'.join(lines))
+    changed, hit = load(capsys)
+    assert not hit and len(versions(toy)) == 1
+    assert_same_data(load(capsys)[0], changed)
+    fresh, _ = load(capsys, data_cache=0)
+    assert_same_data(changed, fresh)
+
+
+def test_reader_of_an_old_pointer_while_a_writer_publishes(toy, capsys, rng):
+    write_dataset(rng)
+    before, _ = load(capsys)
+    reader, hit = load(capsys)
+    assert hit
+    pointer = os.path.join(toy, util.CACHE_POINTER)
+    with open(pointer) as f:
+        old = f.read()
+
+    # a writer publishes a new version and removes the old one
+    with open('data/TOY/TOY.txt', 'a') as f:
+        f.write('\n')
+    after, hit = load(capsys)
+    assert not hit and old not in versions(toy)
+    # graphs already mapped from the removed version stay readable
+    assert_same_data(reader, before)
+
+    # a reader that got the old pointer just before the swap finds no cache and
+    # parses the file instead of failing
+    with open(pointer, 'w') as f:
+        f.write(old)
+    assert util._read_cache(toy, 'data/TOY/TOY.txt') is None
+    again, hit = load(capsys)
+    assert not hit
+    assert_same_data(again, after)
+    assert load(capsys)[1]
@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+import torch
+
+from conftest import random_adj_lists, dense_adjacency
+
+
+class Graph(object):
+    '''
+        the fields of util.GNNGraph PrepareSparseMatrices reads
+    '''
+    def __init__(self, adj):
+        self.num_nodes = len(adj)
+        pairs = [(u, v) for u, nbrs in enumerate(adj) for v in nbrs if u < v]
+        self.num_edges = len(pairs)
+        self.edge_pairs = np.array(pairs, dtype=np.int32).reshape(-1)
+
+
+def batches(rng):
+    '''
+        random batches of graphs and their neighbour lists, including a graph of
+        isolated nodes and a single-graph batch
+    '''
+    out = [random_adj_lists(rng, n, repeats=False) for n in (12, 3, 30)]
+    out[1].insert(1, [[], [], []])
+    out.append(random_adj_lists(rng, 1, repeats=False))
+    return [([Graph(adj) for adj in adj_lists], adj_lists) for adj_lists in out]
+
+
+def dense(mats):
+    return [m.to_dense().numpy() for m in mats]
+
+
+def check_matrices(mats, adj_lists):
+    n2n, e2n, subg = dense(mats)
+    np.testing.assert_array_equal(n2n, dense_adjacency(adj_lists))
+    # every directed edge enters exactly one node
+    np.testing.assert_array_equal(e2n.sum(0), np.ones(e2n.shape[1]))
+    np.testing.assert_array_equal(e2n.sum(1), n2n.sum(1))
+    sizes = [len(adj) for adj in adj_lists]
+    np.testing.assert_array_equal(subg, np.repeat(np.eye(len(sizes)), sizes, axis=1))
+
+
+def test_serial_build_matches_the_batch_graphs(rng, sparse_lib):
+    for graphs, adj_lists in batches(rng):
+        check_matrices(sparse_lib.PrepareSparseMatrices(graphs), adj_lists)
+
+
+@pytest.mark.parametrize('num_threads', [1, 3])
+def test_repeated_batches_reuse_the_pooled_buffers(rng, sparse_lib, num_threads):
+    # a batch prepared again after larger and smaller ones gets the same matrices
+    prepared = batches(rng)
+    first = [dense(sparse_lib.PrepareSparseMatrices(graphs, num_threads=num_threads)) for graphs, _ in prepared]
+    for _ in range(2):
+        for (graphs, _), want in zip(prepared[::-1], first[::-1]):
+            for m, w in zip(dense(sparse_lib.PrepareSparseMatrices(graphs, num_threads=num_threads)), want):
+                np.testing.assert_array_equal(m, w)
+
+
+@pytest.mark.parametrize('num_threads', [2, 5, 0])
+def test_threaded_build_matches_serial(rng, sparse_lib, num_threads):
+    for graphs, adj_lists in batches(rng):
+        serial = sparse_lib.PrepareSparseMatrices(graphs)
+        threaded = sparse_lib.PrepareSparseMatrices(graphs, num_threads=num_threads)
+        for m, want in zip(threaded, serial):
+            assert m.shape == want.shape
+            np.testing.assert_array_equal(m.to_dense().numpy(), want.to_dense().numpy())
+        check_matrices(threaded, adj_lists)
+
+
+@pytest.mark.parametrize('num_threads', [1, 3])
+def test_csr_build_matches_serial_coo(rng, sparse_lib, num_threads):
+    for graphs, adj_lists in batches(rng):
+        serial = sparse_lib.PrepareSparseMatrices(graphs)
+        csr = sparse_lib.PrepareSparseMatrices(graphs, num_threads=num_threads, layout='csr')
+        for m, want in zip(csr, serial):
+            assert m.layout == torch.sparse_csr and m.shape == want.shape
+            np.testing.assert_array_equal(m.to_dense().numpy(), want.to_dense().numpy())
+            # the same entries, in row-major order
+            want = want.coalesce()
+            np.testing.assert_array_equal(m.col_indices().numpy(), want.indices()[1].numpy())
+            np.testing.assert_array_equal(np.diff(m.crow_indices().numpy()),
+                                          np.bincount(want.indices()[0].numpy(), minlength=m.shape[0]))
+        check_matrices(csr, adj_lists)
@@ -0,0 +1,58 @@
+import numpy as np
+
+from conftest import random_adj_lists, dense_adjacency
+from graph_bank import GraphBank, concat_ranges
+
+
+def bank_dense(bank):
+    out = np.zeros((bank.num_nodes, bank.num_nodes))
+    rows = np.repeat(np.arange(bank.num_nodes), np.diff(bank.indptr))
+    np.add.at(out, (rows, bank.indices), 1)
+    return out
+
+
+def test_concat_ranges(rng):
+    starts, sizes = rng.randint(0, 50, 20), rng.randint(0, 5, 20)
+    want = np.concatenate([np.arange(s, s + n) for s, n in zip(starts, sizes)])
+    np.testing.assert_array_equal(concat_ranges(starts, sizes), want)
+    assert len(concat_ranges([], [])) == 0
+
+
+def test_from_lists_is_the_block_diagonal_adjacency(rng):
+    adj_lists = random_adj_lists(rng, 15)
+    bank = GraphBank.from_lists(adj_lists)
+    assert len(bank) == 15 and bank.num_nodes == sum(len(adj) for adj in adj_lists)
+    np.testing.assert_array_equal(bank_dense(bank), dense_adjacency(adj_lists))
+    for i, adj in enumerate(adj_lists):
+        indptr, indices = bank.graph_csr(i)
+        assert bank.graph_size(i) == len(adj)
+        assert [indices[indptr[v]:indptr[v + 1]].tolist() for v in range(len(adj))] == adj
+
+
+def test_local_indices_roundtrip(rng):
+    bank = GraphBank.from_lists(random_adj_lists(rng, 15))
+    again = GraphBank.from_local(bank.indptr, bank.local_indices(), bank.node_offsets)
+    np.testing.assert_array_equal(again.indices, bank.indices)
+    np.testing.assert_array_equal(again.edge_offsets, bank.edge_offsets)
+
+
+def test_concat_and_subset_match_rebuilding(rng):
+    train, test = random_adj_lists(rng, 10), random_adj_lists(rng, 6)
+    both = GraphBank.concat([GraphBank.from_lists(train), GraphBank.from_lists(test)])
+    all_lists = train + test
+    np.testing.assert_array_equal(bank_dense(both), dense_adjacency(all_lists))
+
+    idx = rng.permutation(len(all_lists))[:9]
+    sub = both.subset(idx)
+    want = GraphBank.from_lists([all_lists[i] for i in idx])
+    for name in ('indptr', 'indices', 'node_offsets', 'edge_offsets'):
+        np.testing.assert_array_equal(getattr(sub, name), getattr(want, name))
+
+
+def test_batch_rows(rng):
+    bank = GraphBank.from_lists(random_adj_lists(rng, 10))
+    features = rng.randn(bank.num_nodes, 3)
+    idx = [7, 2, 2, 5]
+    rows, offsets = bank.batch_rows(idx)
+    for b, i in enumerate(idx):
+        np.testing.assert_array_equal(features[rows[offsets[b]:offsets[b + 1]]], features[bank.node_slice(i)])
@@ -0,0 +1,106 @@
+import numpy as np
+import pytest
+import torch
+
+from conftest import random_adj_lists, dense_adjacency
+from graph_bank import GraphBank
+from interaction import _use_native, batched_interaction, block_diag, interaction, landmark_histogram
+from operators import OperatorCache
+from soft_assign import top_assignment
+
+K = 5
+POWERS = (2, 1, 3)
+
+
+def batch(rng, num_graphs, as_tensor):
+    '''
+        block-diagonal operator, float32 assignments and node offsets of a random
+        batch, and the dense adjacency of every graph
+    '''
+    adj_lists = random_adj_lists(rng, num_graphs)
+    bank = GraphBank.from_lists(adj_lists)
+    cache = OperatorCache('raw', as_tensor=as_tensor)
+    adj = block_diag([cache(bank, i)[0] for i in range(len(bank))])
+    q = rng.dirichlet(np.ones(K), bank.num_nodes).astype(np.float32)
+    dense = [(dense_adjacency([a]) > 0).astype(np.float64) for a in adj_lists]
+    return adj, q, bank.node_offsets, dense
+
+
+def expected(q, offsets, dense, power):
+    q = q.astype(np.float64)
+    return np.stack([q[s:e].T.dot(np.linalg.matrix_power(a, power)).dot(q[s:e])
+                     for s, e, a in zip(offsets[:-1], offsets[1:], dense)])
+
+
+@pytest.mark.parametrize('as_tensor', [True, False])
+def test_interaction_matches_dense(rng, as_tensor):
+    adj, q, offsets, dense = batch(rng, 1, as_tensor)
+    if as_tensor:
+        q = torch.from_numpy(q)
+    out = interaction(adj, q, POWERS)
+    for o, power in zip(out, POWERS):
+        o = o.numpy() if as_tensor else o
+        np.testing.assert_allclose(o, expected(np.asarray(q), offsets, dense, power)[0], rtol=1e-4, atol=1e-5)
+
+
+def test_batched_torch_matches_dense_and_backpropagates(rng):
+    adj, q, offsets, dense = batch(rng, 8, True)
+    # requires_grad keeps the padded torch path even when libgnn is built
+    q_t = torch.from_numpy(q).requires_grad_()
+    out = batched_interaction(adj, q_t, offsets, POWERS)
+    for o, power in zip(out, POWERS):
+        np.testing.assert_allclose(o.detach().numpy(), expected(q, offsets, dense, power), rtol=1e-4, atol=1e-5)
+    sum(o.sum() for o in out).backward()
+    assert q_t.grad is not None and q_t.grad.shape == q_t.shape
+
+
+def test_batched_numpy_matches_dense(rng):
+    adj, q, offsets, dense = batch(rng, 8, False)
+    out = batched_interaction(adj, q, offsets, POWERS)
+    for o, power in zip(out, POWERS):
+        np.testing.assert_allclose(o, expected(q, offsets, dense, power), rtol=1e-4, atol=1e-5)
+
+
+@pytest.mark.parametrize('as_tensor', [True, False])
+def test_top_assignment_path_matches_its_dense_assignment(rng, as_tensor):
+    adj, q, offsets, dense = batch(rng, 8, as_tensor)
+    top = top_assignment(torch.from_numpy(q) if as_tensor else q, 2)
+    dense_q = top.to_dense()
+    dense_q = dense_q.numpy() if as_tensor else dense_q
+    out = batched_interaction(adj, top, offsets, POWERS)
+    for o, power in zip(out, POWERS):
+        o = o.numpy() if as_tensor else o
+        np.testing.assert_allclose(o, expected(dense_q, offsets, dense, power), rtol=1e-4, atol=1e-5)
+
+
+@pytest.mark.parametrize('as_tensor', [True, False])
+def test_landmark_histogram(rng, as_tensor):
+    _, q, offsets, _ = batch(rng, 6, False)
+    q = torch.from_numpy(q) if as_tensor else q
+    for assignment, dense_q in ((q, q), (top_assignment(q, 3), top_assignment(q, 3).to_dense())):
+        dense_q = np.asarray(dense_q)
+        want = np.stack([dense_q[s:e].sum(0) for s, e in zip(offsets[:-1], offsets[1:])])
+        np.testing.assert_allclose(np.asarray(landmark_histogram(assignment, offsets)), want, rtol=1e-5, atol=1e-6)
+
+
+@pytest.mark.parametrize('num_threads', [1, 3])
+def test_native_batched_interaction_matches_dense(rng, interaction_lib, num_threads):
+    adj, q, offsets, dense = batch(rng, 12, True)
+    adj = adj.coalesce()
+    rows, cols = adj.indices().numpy()
+    edge_offsets = np.searchsorted(rows, offsets)
+    out = interaction_lib.BatchedInteraction(offsets, edge_offsets, rows, cols, adj.values().numpy(), q, q,
+                                             num_threads=num_threads)
+    assert out.dtype == np.float32
+    np.testing.assert_allclose(out, expected(q, offsets, dense, 1), rtol=1e-4, atol=1e-5)
+
+
+def test_no_grad_batches_go_native(rng, interaction_lib):
+    adj, q, offsets, dense = batch(rng, 12, True)
+    q = torch.from_numpy(q)
+    with torch.no_grad():
+        assert _use_native(adj, q)
+        out = batched_interaction(adj, q, offsets, POWERS)
+    for o, power in zip(out, POWERS):
+        np.testing.assert_allclose(o.numpy(), expected(q.numpy(), offsets, dense, power), rtol=1e-4, atol=1e-5)
+    assert not _use_native(adj, q.requires_grad_())
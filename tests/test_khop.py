@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from conftest import random_adj_lists, dense_adjacency
+from graph_bank import GraphBank
+from khop import aggregate, aggregate_bank, block_adjacency, combine, walk_sums
+
+
+def tagged_bank(rng, num_graphs=20, tags=4):
+    adj_lists = random_adj_lists(rng, num_graphs)
+    bank = GraphBank.from_lists(adj_lists)
+    x = np.eye(tags)[rng.randint(0, tags, bank.num_nodes)]
+    return adj_lists, bank, x
+
+
+def test_block_adjacency_counts_repeated_neighbours(rng):
+    adj_lists, bank, _ = tagged_bank(rng)
+    np.testing.assert_array_equal(block_adjacency(bank.indptr, bank.indices).toarray(),
+                                  dense_adjacency(adj_lists))
+
+
+def test_walk_sums_are_dense_powers(rng):
+    adj_lists, bank, x = tagged_bank(rng)
+    dense = dense_adjacency(adj_lists)
+    walks = walk_sums(block_adjacency(bank.indptr, bank.indices), x, 4)
+    for k, walk in enumerate(walks, 1):
+        np.testing.assert_array_equal(walk, np.linalg.matrix_power(dense, k).dot(x))
+
+
+def test_combine_blocks(rng):
+    x = rng.randn(6, 3)
+    walks = [rng.randn(6, 3) for _ in range(3)]
+    out = combine(x, walks, [(1, (0,)), (90, (1, 2, 3)), (2, (2,))])
+    np.testing.assert_allclose(out, np.hstack([x, 90 * (walks[0] + walks[1] + walks[2]), 2 * walks[1]]))
+
+
+def test_aggregate_bank_matches_aggregate_and_ignores_extra_rows(rng):
+    _, bank, x = tagged_bank(rng)
+    blocks = [(1, (0,)), (90, (3,))]
+    want = aggregate(x, block_adjacency(bank.indptr, bank.indices), blocks)
+    padded = np.vstack([x, np.ones((5, x.shape[1]))])
+    np.testing.assert_array_equal(aggregate_bank(padded, bank, blocks, num_threads=2), want)
+
+
+@pytest.mark.parametrize('num_threads', [1, 3, 0])
+def test_native_walk_sums_match_scipy(rng, walk_sums_lib, num_threads):
+    _, bank, x = tagged_bank(rng, num_graphs=40)
+    x = x + rng.randn(*x.shape)
+    want = walk_sums(block_adjacency(bank.indptr, bank.indices), x, 3)
+    out = walk_sums_lib.WalkSums(bank, x, 3, num_threads=num_threads)
+    assert out.shape == (3, bank.num_nodes, x.shape[1])
+    for walk, expected in zip(out, want):
+        np.testing.assert_allclose(walk, expected, rtol=1e-12, atol=1e-12)
+
+    buf = np.full(out.shape, np.nan)
+    assert walk_sums_lib.WalkSums(bank, x, 3, out=buf, num_threads=num_threads) is buf
+    np.testing.assert_array_equal(buf, out)
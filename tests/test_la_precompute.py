@@ -0,0 +1,87 @@
+import os
+
+import numpy as np
+
+from conftest import random_adj_lists, dense_adjacency
+from graph_bank import GraphBank
+from la_precompute import graph_layout, node_inputs, precompute
+from la_store import LAStore
+
+FEAT_DIM = 4
+
+
+class Graph(object):
+    def __init__(self, node_tags):
+        self.num_nodes = len(node_tags)
+        self.node_tags = node_tags
+        self.node_features = None
+
+
+def make_graphs(rng, num_graphs):
+    adj_lists = random_adj_lists(rng, num_graphs)
+    graphs = [Graph(list(rng.randint(0, FEAT_DIM, len(adj)))) for adj in adj_lists]
+    return graphs, adj_lists
+
+
+def expected(graphs, adj_lists, order):
+    x = np.concatenate([node_inputs(g, FEAT_DIM) for g in graphs], 0)
+    return np.linalg.matrix_power(dense_adjacency(adj_lists), order).dot(x)
+
+
+def test_precompute_writes_walk_sums_in_graph_order(tmp_path, rng):
+    graphs, adj_lists = make_graphs(rng, 30)
+    bank = GraphBank.from_lists(adj_lists)
+    store = LAStore(str(tmp_path))
+    precompute(store, graphs, bank, FEAT_DIM, (1, 3), workers=1, chunk_nodes=20)
+
+    layout = graph_layout(graphs, bank, FEAT_DIM)
+    for k in (1, 3):
+        rows = LAStore(str(tmp_path)).load(k, layout=layout)
+        assert isinstance(rows, np.memmap)
+        np.testing.assert_allclose(rows, expected(graphs, adj_lists, k), rtol=0, atol=1e-9)
+
+
+def test_pool_and_shards_give_the_same_rows(tmp_path, rng):
+    graphs, adj_lists = make_graphs(rng, 30)
+    bank = GraphBank.from_lists(adj_lists)
+    serial, pooled = LAStore(str(tmp_path / 'serial')), LAStore(str(tmp_path / 'pooled'))
+    precompute(serial, graphs, bank, FEAT_DIM, (2,), workers=1, chunk_nodes=10 ** 6)
+    precompute(pooled, graphs, bank, FEAT_DIM, (2,), workers=2, chunk_nodes=7)
+    np.testing.assert_array_equal(serial.load(2), pooled.load(2))
+
+
+def test_rerun_only_recomputes_changed_graphs(tmp_path, rng, capsys):
+    graphs, adj_lists = make_graphs(rng, 20)
+    store = LAStore(str(tmp_path))
+    precompute(store, graphs, GraphBank.from_lists(adj_lists), FEAT_DIM, (3,), workers=1)
+    precompute(store, graphs, GraphBank.from_lists(adj_lists), FEAT_DIM, (3,), workers=1)
+    assert 'up to date' in capsys.readouterr().out
+
+    # retag one graph and put another fold's order on the rest
+    graphs[5].node_tags = [(t + 1) % FEAT_DIM for t in graphs[5].node_tags]
+    order = rng.permutation(len(graphs))
+    graphs = [graphs[i] for i in order]
+    adj_lists = [adj_lists[i] for i in order]
+    bank = GraphBank.from_lists(adj_lists)
+    precompute(store, graphs, bank, FEAT_DIM, (3,), workers=1)
+    assert 'recomputing 1 of 20 graphs' in capsys.readouterr().out
+    np.testing.assert_allclose(store.load(3, layout=graph_layout(graphs, bank, FEAT_DIM)),
+                               expected(graphs, adj_lists, 3), rtol=0, atol=1e-9)
+
+
+def test_one_store_serves_every_fold(tmp_path, rng, capsys):
+    graphs, adj_lists = make_graphs(rng, 20)
+    store = LAStore(str(tmp_path))
+    precompute(store, graphs, GraphBank.from_lists(adj_lists), FEAT_DIM, (3,), workers=1)
+    written = os.path.getmtime(os.path.join(str(tmp_path), 'order3.npy'))
+
+    # another fold: the same graphs split and ordered differently
+    order = rng.permutation(len(graphs))
+    graphs = [graphs[i] for i in order]
+    adj_lists = [adj_lists[i] for i in order]
+    bank = GraphBank.from_lists(adj_lists)
+    precompute(store, graphs, bank, FEAT_DIM, (3,), workers=1)
+    assert 'up to date' in capsys.readouterr().out
+    assert os.path.getmtime(os.path.join(str(tmp_path), 'order3.npy')) == written
+    np.testing.assert_allclose(LAStore(str(tmp_path)).load(3, layout=graph_layout(graphs, bank, FEAT_DIM)),
+                               expected(graphs, adj_lists, 3), rtol=0, atol=1e-9)
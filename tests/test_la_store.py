@@ -0,0 +1,114 @@
+import multiprocessing as mp
+import os
+import pickle
+import zipfile
+
+import numpy as np
+import pytest
+
+from la_store import LAStore
+
+HASHES = ['g0', 'g1', 'g2']
+NUM_NODES = [2, 1, 3]
+
+
+def test_add_and_load_roundtrip(tmp_path):
+    store = LAStore(str(tmp_path))
+    features = np.arange(12.0).reshape(6, 2)
+    store.add(3, features, layout=(HASHES, NUM_NODES))
+
+    loaded = LAStore(str(tmp_path)).load(3)
+    assert isinstance(loaded, np.memmap)
+    np.testing.assert_array_equal(loaded, features)
+    np.testing.assert_array_equal(LAStore(str(tmp_path)).load(3, 1, 4), features[1:4])
+    assert store.orders() == [3]
+
+
+def test_commit_from_create(tmp_path):
+    store = LAStore(str(tmp_path))
+    out = store.create(1, (4, 3))
+    out[:] = 7
+    store.commit(1, out, layout=(['a', 'b'], [1, 3]))
+    np.testing.assert_array_equal(LAStore(str(tmp_path)).load(1), np.full((4, 3), 7.0))
+    assert store.graph_rows(1) == {'a': 0, 'b': 1}
+
+
+def test_load_in_own_layout_is_the_map(tmp_path):
+    store = LAStore(str(tmp_path))
+    store.add(2, np.ones((6, 2)), layout=(HASHES, NUM_NODES))
+    assert isinstance(store.load(2, layout=(HASHES, NUM_NODES)), np.memmap)
+
+
+def test_load_gathers_rows_into_another_graph_order(tmp_path):
+    store = LAStore(str(tmp_path))
+    features = np.arange(12.0).reshape(6, 2)
+    store.add(3, features, layout=(HASHES, NUM_NODES))
+
+    # another fold: same graphs, different order
+    rows = store.load(3, layout=(['g2', 'g0', 'g1'], [3, 2, 1]))
+    np.testing.assert_array_equal(rows, features[[3, 4, 5, 0, 1, 2]])
+    # a fold holding only some of the graphs
+    np.testing.assert_array_equal(store.load(3, layout=(['g1'], [1])), features[[2]])
+
+
+def test_load_rejects_graphs_the_store_lacks(tmp_path):
+    store = LAStore(str(tmp_path))
+    store.add(3, np.zeros((6, 2)), layout=(HASHES, NUM_NODES))
+    with pytest.raises(ValueError):
+        store.load(3, layout=(['g0', 'unknown'], [2, 4]))
+
+
+def test_legacy_pickle_and_zip_import(tmp_path, monkeypatch):
+    # main.py names the legacy files relative to the dataset folder
+    monkeypatch.chdir(tmp_path)
+    features = np.arange(8.0).reshape(4, 2)
+    with open('1order_LA.pkl', 'wb') as f:
+        pickle.dump(features, f)
+    with zipfile.ZipFile('2order_LA.zip', 'w') as archive:
+        archive.writestr('2order_LA.pkl', pickle.dumps(features * 2))
+
+    store = LAStore('LA_store', legacy='%dorder_LA')
+    np.testing.assert_array_equal(store.load(1), features)
+    np.testing.assert_array_equal(store.load(2), features * 2)
+    assert os.path.exists(os.path.join('LA_store', 'order2.npy'))
+    # legacy rows carry no graph layout, only their count can be checked
+    np.testing.assert_array_equal(store.load(1, layout=(['a', 'b'], [1, 3])), features)
+    with pytest.raises(ValueError):
+        store.load(1, layout=(['a'], [3]))
+    with pytest.raises(KeyError):
+        store.load(3)
+
+
+def test_publish_keeps_orders_written_by_another_process(tmp_path):
+    first, second = LAStore(str(tmp_path)), LAStore(str(tmp_path))
+    first.add(1, np.zeros((2, 1)), layout=(['a'], [2]))
+    second.add(2, np.ones((2, 1)), layout=(['a'], [2]))
+    assert LAStore(str(tmp_path)).orders() == [1, 2]
+
+
+def _import_fold(barrier, root, legacy):
+    makedirs = os.makedirs
+
+    def racing_makedirs(*args, **kwargs):
+        # both folds found no store and create its directory together
+        barrier.wait()
+        return makedirs(*args, **kwargs)
+
+    os.makedirs = racing_makedirs
+    LAStore(root, legacy=legacy).load(1)
+
+
+def test_concurrent_legacy_imports_into_a_new_store(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    features = np.arange(8.0).reshape(4, 2)
+    with zipfile.ZipFile('1order_LA.zip', 'w') as archive:
+        archive.writestr('1order_LA.pkl', pickle.dumps(features))
+    ctx = mp.get_context('spawn')
+    barrier = ctx.Barrier(2)
+    procs = [ctx.Process(target=_import_fold, args=(barrier, 'LA_store', '%dorder_LA')) for _ in range(2)]
+    for proc in procs:
+        proc.start()
+    for proc in procs:
+        proc.join()
+    assert [proc.exitcode for proc in procs] == [0, 0]
+    np.testing.assert_array_equal(LAStore('LA_store').load(1), features)
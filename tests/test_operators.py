@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+import torch
+
+from conftest import random_adj_lists, dense_adjacency
+from graph_bank import GraphBank
+from operators import OperatorCache, graph_adjacency, normalize
+
+
+def dense_operator(adj, scheme):
+    '''
+        the dense recipes normalize() replaces
+    '''
+    a = (dense_adjacency([adj]) > 0).astype(float)
+    if scheme == 'raw':
+        return a
+    deg = a.sum(1)
+    if scheme == 'rw':
+        return a / np.where(deg > 0, deg, 1)[:, None]
+    a = a / np.sqrt(np.sqrt(deg) + 0.001)[None, :]
+    d = a.sum(1)
+    d = np.where(d > 0, 1 / np.sqrt(np.where(d > 0, d, 1)), 0)
+    return d[:, None] * a * d[None, :]
+
+
+def test_graph_adjacency_drops_repeated_neighbours(rng):
+    adj_lists = random_adj_lists(rng, 10)
+    bank = GraphBank.from_lists(adj_lists)
+    for i, adj in enumerate(adj_lists):
+        np.testing.assert_array_equal(graph_adjacency(bank.graph_csr(i)).toarray(),
+                                      dense_adjacency([adj]) > 0)
+
+
+@pytest.mark.parametrize('scheme', ['sym', 'rw', 'raw'])
+def test_normalize_matches_dense(rng, scheme):
+    adj_lists = random_adj_lists(rng, 10)
+    bank = GraphBank.from_lists(adj_lists)
+    for i, adj in enumerate(adj_lists):
+        k = normalize(graph_adjacency(bank.graph_csr(i)), scheme)
+        np.testing.assert_allclose(k.toarray(), dense_operator(adj, scheme), rtol=1e-12, atol=1e-12)
+
+
+def test_normalize_rejects_unknown_scheme():
+    with pytest.raises(ValueError):
+        normalize(graph_adjacency((np.array([0, 0]), np.array([], dtype=np.int64))), 'lap')
+
+
+@pytest.mark.parametrize('as_tensor', [True, False])
+def test_cache_powers_in_requested_order(rng, as_tensor):
+    adj_lists = random_adj_lists(rng, 5)
+    bank = GraphBank.from_lists(adj_lists)
+    cache = OperatorCache('sym', powers=(3, 1, 2), as_tensor=as_tensor)
+    for i, adj in enumerate(adj_lists):
+        k = dense_operator(adj, 'sym')
+        ops = cache(bank, i)
+        assert len(ops) == 3
+        for op, power in zip(ops, (3, 1, 2)):
+            op = op.to_dense().numpy() if as_tensor else op.toarray()
+            assert op.dtype == np.float32
+            np.testing.assert_allclose(op, np.linalg.matrix_power(k, power), rtol=1e-5, atol=1e-6)
+
+
+def test_cache_builds_each_graph_once_per_bank(rng):
+    adj_lists = random_adj_lists(rng, 3)
+    bank = GraphBank.from_lists(adj_lists)
+    cache = OperatorCache('raw')
+    first = cache(bank, 1)
+    assert cache(bank, 1) is first
+    # an equal but distinct bank gets its own entries
+    other = GraphBank.from_lists(adj_lists)
+    assert cache(other, 1) is not first
+    assert torch.equal(cache(other, 1)[0].to_dense(), first[0].to_dense())
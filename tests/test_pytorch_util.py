@@ -0,0 +1,73 @@
+import torch
+import torch.nn as nn
+
+from pytorch_util import FoldedLinear, fold_linear_chain
+
+
+def chain(*sizes):
+    torch.manual_seed(0)
+    return [nn.Linear(a, b).double() for a, b in zip(sizes[:-1], sizes[1:])]
+
+
+def test_fold_matches_the_chain():
+    layers = chain(6, 5, 4, 3)
+    x = torch.randn(7, 6, dtype=torch.float64)
+    want = x
+    for layer in layers:
+        want = layer(want)
+    weight, bias = fold_linear_chain(layers)
+    torch.testing.assert_close(torch.nn.functional.linear(x, weight, bias), want)
+
+
+def test_rowwise_fold_matches_the_chain():
+    layers = chain(4, 3, 2)
+    # the second layer reads the 5 rows of the first one's output flattened
+    layers[1] = nn.Linear(5 * 3, 2).double()
+    x = torch.randn(8, 5, 4, dtype=torch.float64)
+    want = layers[1](layers[0](x).reshape(8, -1))
+    weight, bias = fold_linear_chain(layers, rowwise=True)
+    torch.testing.assert_close(torch.nn.functional.linear(x.reshape(8, -1), weight, bias), want)
+
+
+def test_folded_linear_refolds_only_after_invalidate():
+    layers = chain(3, 4, 2)
+    folded = FoldedLinear(layers)
+    x = torch.randn(5, 3, dtype=torch.float64)
+    before = folded(x)
+    weight = folded.weight
+    with torch.no_grad():
+        layers[1].weight.add_(1)
+    assert folded.weight is weight
+    torch.testing.assert_close(folded(x), before)
+
+    folded.invalidate()
+    torch.testing.assert_close(folded(x), layers[1](layers[0](x)))
+    assert not folded.weight.requires_grad
+
+
+class Head(nn.Module):
+    def __init__(self):
+        super(Head, self).__init__()
+        self.fc1, self.fc2 = chain(3, 4, 2)
+        self.folded = FoldedLinear([self.fc1, self.fc2])
+
+    def forward(self, x):
+        return self.folded(x) if not self.training else self.fc2(self.fc1(x))
+
+
+def test_loading_weights_in_eval_mode_refolds():
+    head, other = Head().eval(), Head()
+    with torch.no_grad():
+        for p in other.parameters():
+            p.add_(torch.randn_like(p))
+    x = torch.randn(5, 3, dtype=torch.float64)
+    before = head(x)
+
+    head.load_state_dict(other.state_dict())
+    assert not head.training
+    torch.testing.assert_close(head(x), other.fc2(other.fc1(x)))
+    assert not torch.allclose(head(x), before)
+
+    # a layer loading its own state dict drops the fold too
+    head.fc1.load_state_dict(Head().fc1.state_dict())
+    torch.testing.assert_close(head(x), head.fc2(head.fc1(x)))
@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+import torch
+import torch.nn.functional as F
+
+from soft_assign import ScheduledAssignment, kl_divergence, soft_assignment, target_distribution, top_assignment
+
+
+def broadcast_assignment(z, centers, alpha):
+    '''
+        the (n, K, d) difference tensor formula the chunked GEMM replaces
+    '''
+    q = 1.0 / (1.0 + torch.sum((z.unsqueeze(1) - centers) ** 2, 2) / alpha)
+    q = q.pow((alpha + 1.0) / 2.0)
+    return (q.t() / torch.sum(q, 1)).t()
+
+
+@pytest.mark.parametrize('chunk', [None, 7, 1000])
+@pytest.mark.parametrize('alpha', [1.0, 2.5])
+def test_soft_assignment_matches_broadcast(chunk, alpha):
+    torch.manual_seed(0)
+    z = torch.randn(50, 6, dtype=torch.float64, requires_grad=True)
+    centers = torch.randn(4, 6, dtype=torch.float64, requires_grad=True)
+    q = soft_assignment(z, centers, alpha, chunk)
+    want = broadcast_assignment(z, centers, alpha)
+    torch.testing.assert_close(q, want)
+
+    grads = torch.autograd.grad(q.pow(2).sum(), (z, centers))
+    want_grads = torch.autograd.grad(want.pow(2).sum(), (z, centers))
+    for g, w in zip(grads, want_grads):
+        torch.testing.assert_close(g, w)
+
+
+def test_kl_divergence_keeps_the_mean_scaling():
+    torch.manual_seed(0)
+    q = torch.softmax(torch.randn(20, 5), 1)
+    p = target_distribution(q)
+    torch.testing.assert_close(kl_divergence(q, p), F.kl_div(q.log(), p, reduction='sum') / q.numel())
+
+
+def test_scheduled_assignment_rows_and_refresh():
+    torch.manual_seed(0)
+    z = torch.randn(30, 4)
+    centers = torch.randn(3, 4, requires_grad=True)
+    sched = ScheduledAssignment(z, centers, interval=2)
+    full = soft_assignment(z, centers)
+    torch.testing.assert_close(sched.p, target_distribution(full.detach()))
+
+    rows = [3, 10, 11]
+    torch.testing.assert_close(sched[rows], full[rows])
+    loss = sched.kl_loss()
+    torch.testing.assert_close(loss, kl_divergence(full[rows], sched.p[rows]))
+    loss.backward()
+    assert centers.grad is not None
+
+    p = sched.p
+    with torch.no_grad():
+        centers += 1
+    sched.step()
+    assert sched.p is p
+    sched.step()
+    torch.testing.assert_close(sched.p, target_distribution(soft_assignment(z, centers).detach()))
+
+
+@pytest.mark.parametrize('as_tensor', [True, False])
+def test_top_assignment_keeps_the_strongest_centers(as_tensor):
+    rng = np.random.RandomState(0)
+    q = rng.dirichlet(np.ones(6), 25)
+    top = top_assignment(torch.from_numpy(q) if as_tensor else q, 2)
+    dense = np.asarray(top.to_dense())
+    assert top.shape == (25, 6)
+    np.testing.assert_allclose(dense.sum(1), 1)
+    kept = np.sort(q, 1)[:, -2:]
+    np.testing.assert_allclose(np.sort(dense, 1)[:, -2:], kept / kept.sum(1, keepdims=True))
+    assert ((dense > 0).sum(1) == 2).all()